@@ -1,19 +1,21 @@
 import streamlit as st
-from bluesky import get_following_list, get_user_posts, get_followers_of_following
-from gemini_helper import setup_gemini, analyze_interests, suggest_connections
-from atproto import Client
-import time
+from crawler import DEFAULT_MAX_WORKERS, DEFAULT_REQUESTS_PER_SECOND
+from retry import PLATFORM_REQUESTS_PER_SECOND
+from gemini_helper import analyze_interests, format_interests, stream_text, cache_stats, MAX_TOPICS
+from clients import get_gemini_model
+from interest_profiles import profile_topics
+from jobs import submit_job, is_active, recover_interrupted_jobs, get_stored_recommendations, interest_corpus
+from prompt_builder import build_chat_context, retrieve_candidates, DEFAULT_TOKEN_BUDGET
 from dotenv import load_dotenv
 import os
 from database import init_db, verify_user, save_user, save_bluesky_credentials, get_bluesky_credentials
-from database import save_following_data, get_following_data, save_potential_connections, get_potential_connections
-import json
+from database import get_following_data, search_following_data, count_following_data, get_potential_connections, get_job, get_latest_job
 from streamlit_option_menu import option_menu
-from reddit import get_reddit_client, get_subscribed_subreddits
-from database import save_reddit_credentials, get_reddit_credentials, save_reddit_subscriptions, get_reddit_subscriptions
+from database import save_reddit_credentials, get_reddit_credentials, get_reddit_subscriptions, count_reddit_subscriptions
 
 # Initialize database
 init_db()
+recover_interrupted_jobs()
 
 # Load environment variables from .env file
 load_dotenv()
@@ -109,14 +111,73 @@ if 'username' not in st.session_state:
     st.session_state.username = None
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-if 'following' not in st.session_state:
-    st.session_state.following = []
 if 'interests_analyzed' not in st.session_state:
     st.session_state.interests_analyzed = False
 if 'potential_connections' not in st.session_state:
     st.session_state.potential_connections = []
-if 'client' not in st.session_state:
-    st.session_state.client = None
+
+if 'handled_jobs' not in st.session_state:
+    st.session_state.handled_jobs = set()
+
+JOB_POLL_SECONDS = 2
+
+def show_job_status(kind, on_done=None, render_partial=None):
+    """
+    Show the user's latest job of this kind, polling while it runs. on_done is
+    called once per session for each finished job to load its results, and
+    render_partial draws any partial result while the job is still running.
+    """
+    job = get_latest_job(st.session_state.username, kind)
+    if not job:
+        return None
+    if job["status"] == "done" and on_done and job["id"] not in st.session_state.handled_jobs:
+        st.session_state.handled_jobs.add(job["id"])
+        on_done(job)
+    
+    @st.fragment(run_every=JOB_POLL_SECONDS if is_active(job) else None)
+    def job_status():
+        current = get_job(job["id"])
+        if is_active(current):
+            st.progress(current["progress"] or 0.0, text=current["message"] or "Waiting to start...")
+            if render_partial and current["result"]:
+                render_partial(current["result"])
+        elif is_active(job):
+            # Finished since the page was drawn, rerun the whole page to show results
+            st.rerun()
+        elif current["status"] == "done":
+            if current["result"] and current["result"].get("summary"):
+                st.success(current["result"]["summary"])
+        else:
+            st.error(f"Job failed: {current['error']}")
+    
+    job_status()
+    return job
+
+PAGE_SIZES = [25, 50, 100, 200]
+
+def paginate(key, total):
+    """
+    Page size and page number controls for a list of total items. Returns (limit, offset).
+    """
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+    with col2:
+        page = st.number_input("Page", min_value=1, value=1, step=1, key=f"{key}_page")
+    # A narrower search can leave fewer pages than the one selected
+    page = min(page, pages)
+    with col3:
+        st.caption(f"{total} results, page {page} of {pages}")
+    return page_size, (page - 1) * page_size
+
+def load_bluesky_data(job):
+    st.session_state.potential_connections = get_potential_connections(st.session_state.username)
+    if st.session_state.potential_connections:
+        st.session_state.interests_analyzed = True
+
+def load_reddit_data(job):
+    st.session_state.reddit_subscriptions = get_reddit_subscriptions(st.session_state.username)
 
 # Sidebar navigation using streamlit-option-menu
 with st.sidebar:
@@ -127,14 +188,16 @@ with st.sidebar:
         st.success(f"Logged in as: {st.session_state.username}")
         if st.button("Logout"):
             st.session_state.username = None
-            st.session_state.client = None
-            st.session_state.following = []
             st.session_state.interests_analyzed = False
             st.session_state.potential_connections = []
             st.session_state.messages = []
+            st.session_state.handled_jobs = set()
             # Clear Reddit session state as well
             if 'reddit_subscriptions' in st.session_state:
                 st.session_state.reddit_subscriptions = []
+            st.session_state.reddit_communities = []
+            st.session_state.reddit_similar_users = []
+            st.session_state.bluesky_similar_accounts = []
             st.rerun()
     
     # Navigation options with option_menu
@@ -156,6 +219,19 @@ with st.sidebar:
     st.markdown("### Configuration")
     gemini_api_key = st.text_input("Gemini API Key", value=os.getenv("GEMINI_API_KEY"), type="password")
     temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.7, step=0.1)
+    st.caption(f"Gemini cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+    chat_token_budget = st.number_input("Chat context budget (tokens)", min_value=500, max_value=30000,
+                                        value=DEFAULT_TOKEN_BUDGET, step=500)
+    
+    with st.expander("Crawler Settings"):
+        # Independent of the Gemini key: local recommendations need the crawled candidates too
+        crawl_network = st.checkbox("Crawl followers of followed accounts", value=True)
+        crawl_followees = st.number_input("Followees to crawl", min_value=1, max_value=1000, value=3)
+        crawl_followers_limit = st.number_input("Followers per followee", min_value=1, max_value=100, value=10)
+        crawl_workers = st.slider("Concurrent requests", min_value=1, max_value=32, value=DEFAULT_MAX_WORKERS)
+        # A cap for this crawl; every Bluesky request in the process shares one budget of this size
+        crawl_rate = st.slider("Requests per second", min_value=1, max_value=PLATFORM_REQUESTS_PER_SECOND["bluesky"],
+                               value=DEFAULT_REQUESTS_PER_SECOND)
     
 
 # Main content based on selection
@@ -176,9 +252,6 @@ if selected == "Login":
                 st.session_state.username = username
                 st.success("Logged in successfully!")
                 # Load saved data if available
-                following_data = get_following_data(username)
-                if following_data:
-                    st.session_state.following = following_data
                 potential_connections = get_potential_connections(username)
                 if potential_connections:
                     st.session_state.potential_connections = potential_connections
@@ -246,67 +319,23 @@ elif selected == "User Details":
                     st.success("Bluesky credentials saved successfully!")
             
             with col2:
+                incremental_refresh = st.checkbox("Only fetch changes since last time", value=True)
                 if st.button("Fetch Data from Bluesky"):
-                    with st.spinner("Connecting to Bluesky..."):
-                        try:
-                            client = Client()
-                            client.login(bluesky_username, bluesky_password)
-                            st.session_state.client = client
-                            
-                            # Fetch following list
-                            following = get_following_list(client)
-                            st.session_state.following = following
-                            
-                            # Save to database
-                            following_data = [
-                                {
-                                    "did": f.did,
-                                    "handle": f.handle,
-                                    "display_name": f.display_name
-                                } for f in following
-                            ]
-                            save_following_data(st.session_state.username, following_data)
-                            
-                            # Get potential connections
-                            with st.spinner("Analyzing your network..."):
-                                # Set up Gemini if API key is provided
-                                if gemini_api_key:
-                                    model = setup_gemini(gemini_api_key, temperature)
-                                    
-                                    # Get posts from people you follow to analyze interests
-                                    all_posts_data = []
-                                    for follow in following[:5]:  # Limit to first 5 for demo
-                                        posts = get_user_posts(client, follow.did, limit=5)
-                                        for post in posts:
-                                            if hasattr(post.post, 'record') and hasattr(post.post.record, 'text'):
-                                                all_posts_data.append(f"{follow.handle}: {post.post.record.text}")
-                                    
-                                    # Get potential connections for later use
-                                    potential_connections = []
-                                    for follow in following[:3]:  # Limit to first 3 for demo
-                                        followers = get_followers_of_following(client, follow.did, limit=10)
-                                        for follower in followers:
-                                            if follower.did != client.me.did:  # Skip yourself
-                                                posts = get_user_posts(client, follower.did, limit=3)
-                                                post_texts = []
-                                                for post in posts:
-                                                    if hasattr(post.post, 'record') and hasattr(post.post.record, 'text'):
-                                                        post_texts.append(post.post.record.text)
-                                                
-                                                potential_connections.append({
-                                                    "did": follower.did,
-                                                    "handle": follower.handle,
-                                                    "name": follower.display_name,
-                                                    "posts": post_texts
-                                                })
-                                    
-                                    st.session_state.potential_connections = potential_connections
-                                    save_potential_connections(st.session_state.username, potential_connections)
-                                    st.session_state.interests_analyzed = True
-                            
-                            st.success("Data fetched and saved successfully!")
-                        except Exception as e:
-                            st.error(f"Error connecting to Bluesky: {e}")
+                    # Runs in the background; the status below polls until it finishes
+                    submit_job(
+                        st.session_state.username,
+                        "bluesky_fetch",
+                        bluesky_username=bluesky_username,
+                        bluesky_password=bluesky_password,
+                        incremental=incremental_refresh,
+                        crawl=crawl_network,
+                        crawl_followees=crawl_followees,
+                        followers_limit=crawl_followers_limit,
+                        max_workers=crawl_workers,
+                        requests_per_second=crawl_rate
+                    )
+            
+            show_job_status("bluesky_fetch", on_done=load_bluesky_data)
         
         with reddit_tab:
             st.subheader("Reddit Account")
@@ -334,22 +363,14 @@ elif selected == "User Details":
             
             with col2:
                 if st.button("Fetch Reddit Subscriptions"):
-                    with st.spinner("Connecting to Reddit..."):
-                        try:
-                            reddit_client = get_reddit_client(reddit_username, reddit_password)
-                            if reddit_client:
-                                # Fetch subscribed subreddits
-                                subreddits = get_subscribed_subreddits(reddit_client)
-                                st.session_state.reddit_subscriptions = subreddits
-                                
-                                # Save to database
-                                save_reddit_subscriptions(st.session_state.username, subreddits)
-                                
-                                st.success(f"Successfully fetched {len(subreddits)} subreddit subscriptions!")
-                            else:
-                                st.error("Failed to initialize Reddit client. Please check your credentials.")
-                        except Exception as e:
-                            st.error(f"Error connecting to Reddit: {e}")
+                    submit_job(
+                        st.session_state.username,
+                        "reddit_fetch",
+                        reddit_username=reddit_username,
+                        reddit_password=reddit_password
+                    )
+            
+            show_job_status("reddit_fetch", on_done=load_reddit_data)
 
 # Add a new section in the sidebar for Reddit subscriptions
 elif selected == "Following":
@@ -363,60 +384,50 @@ elif selected == "Following":
         
         with bluesky_tab:
             # Check if we have following data
-            if not st.session_state.following:
-                following_data = get_following_data(st.session_state.username)
-                if following_data:
-                    st.session_state.following = following_data
-                else:
-                    st.info("No following data available. Please fetch data from the User Details page.")
-                    st.stop()
+            total_following = count_following_data(st.session_state.username)
+            if not total_following:
+                st.info("No following data available. Please fetch data from the User Details page.")
+                st.stop()
             
             # Create a search box
             search = st.text_input("Search accounts", "")
             
+            # Only the visible page is read from the database and rendered, so long lists stay fast
+            matches = count_following_data(st.session_state.username, search) if search else total_following
+            limit, offset = paginate("following", matches)
+            if search:
+                visible_following = search_following_data(st.session_state.username, search, limit, offset)
+            else:
+                visible_following = get_following_data(st.session_state.username, limit, offset)
+            
             # Create a container for the list with scrolling
             following_container = st.container()
             with following_container:
-                for follow in st.session_state.following:
-                    # If it's a dictionary (from database) or an object (from API)
-                    if isinstance(follow, dict):
-                        handle = follow.get("handle", "")
-                        display_name = follow.get("display_name", "No display name")
-                    else:
-                        # For ProfileView objects, use attribute access instead of .get()
-                        handle = getattr(follow, "handle", "unknown")
-                        display_name = getattr(follow, "display_name", "No display name")
+                for follow in visible_following:
+                    handle = follow.get("handle", "")
+                    display_name = follow.get("display_name") or "No display name"
                     
-                    # Filter by search term if provided
-                    if search and search.lower() not in handle.lower() and search.lower() not in display_name.lower():
-                        continue
-                    
-                    # Display the account - use the variables we've safely extracted
+                    # Display the account
                     st.write(f"**{display_name}** (@{handle})")
 
         with reddit_tab:
-            # Get Reddit subscriptions from database if not in session state
-            if not hasattr(st.session_state, 'reddit_subscriptions') or not st.session_state.reddit_subscriptions:
-                reddit_subs = get_reddit_subscriptions(st.session_state.username)
-                if reddit_subs:
-                    st.session_state.reddit_subscriptions = reddit_subs
+            total_subreddits = count_reddit_subscriptions(st.session_state.username)
             
-            if not hasattr(st.session_state, 'reddit_subscriptions') or not st.session_state.reddit_subscriptions:
+            if not total_subreddits:
                 st.info("No Reddit subscription data available. Please fetch data from the User Details page.")
             else:
                 # Display subreddit subscriptions
-                st.write(f"You are subscribed to {len(st.session_state.reddit_subscriptions)} subreddits:")
+                st.write(f"You are subscribed to {total_subreddits} subreddits:")
                 
                 # Create a search box for Reddit
                 reddit_search = st.text_input("Search subreddits", "")
                 
+                matches = count_reddit_subscriptions(st.session_state.username, reddit_search) if reddit_search else total_subreddits
+                limit, offset = paginate("subreddits", matches)
+                
                 # Display subreddits in a nice format
-                for i, subreddit in enumerate(st.session_state.reddit_subscriptions):
-                    # Filter by search term if provided
+                for subreddit in get_reddit_subscriptions(st.session_state.username, limit, offset, search=reddit_search or None):
                     subreddit_name = subreddit.get('name', '')
-                    if reddit_search and reddit_search.lower() not in subreddit_name.lower():
-                        continue
-                        
                     with st.container():
                         col1, col2 = st.columns([1, 3])
                         with col1:
@@ -445,168 +456,132 @@ elif selected == "Recommendations":
         # Create tabs for different platforms
         bluesky_tab, reddit_tab = st.tabs(["Bluesky Recommendations", "Reddit Recommendations"])
         
-        # Check if we have Gemini API key
+        # Without a Gemini API key the jobs extract interests and rank connections locally
         if not gemini_api_key:
-            st.error("Please provide a Gemini API key in the sidebar to generate recommendations.")
-            st.stop()
+            st.info("No Gemini API key provided: interests and recommendations are computed locally. "
+                    "Add a key in the sidebar for AI-written recommendations.")
+        
+        # Check if we have data to analyze
+        has_bluesky_data = bool(get_following_data(st.session_state.username, limit=1)
+                                and get_potential_connections(st.session_state.username, limit=1, posts_limit=0))
+        has_reddit_data = bool(get_reddit_subscriptions(st.session_state.username, limit=1))
         
-        # Set up Gemini model
-        try:
-            model = setup_gemini(gemini_api_key, temperature)
-        except Exception as e:
-            st.error(f"Error setting up Gemini model: {e}")
+        if not has_bluesky_data and not has_reddit_data:
+            st.warning("No data available. Please fetch data from the User Details page first.")
             st.stop()
         
-        # Fetch data and generate recommendations
-        with st.spinner("Analyzing your interests and generating recommendations..."):
-            # 1. Fetch Bluesky data
-            following_data = get_following_data(st.session_state.username)
-            potential_connections = get_potential_connections(st.session_state.username)
-            
-            # 2. Fetch Reddit data
-            reddit_subs = get_reddit_subscriptions(st.session_state.username)
-            
-            # Check if we have data to analyze
-            has_bluesky_data = bool(following_data and potential_connections)
-            has_reddit_data = bool(reddit_subs)
-            
-            if not has_bluesky_data and not has_reddit_data:
-                st.warning("No data available. Please fetch data from the User Details page first.")
-                st.stop()
-            
-            # 3. Generate interests and recommendations
-            
-            # For Bluesky
-            with bluesky_tab:
-                if has_bluesky_data:
-                    # Generate interests if not already done
-                    if not st.session_state.bluesky_interests:
-                        # Prepare data for analysis - extract posts from potential connections
-                        all_posts_data = []
-                        for conn in potential_connections[:5]:  # Limit to first 5 for performance
-                            if isinstance(conn, dict) and "posts" in conn:
-                                for post in conn.get("posts", []):
-                                    all_posts_data.append(f"{conn.get('handle', 'unknown')}: {post}")
-                        
-                        if all_posts_data:
-                            # Extract interests using Gemini
-                            st.session_state.bluesky_interests = analyze_interests(model, "\n".join(all_posts_data))
-                    
-                    # Display interests
-                    st.subheader("Your Bluesky Interests")
-                    st.write(st.session_state.bluesky_interests)
-                    
-                    # Generate recommendations if not already done
-                    if not st.session_state.bluesky_recommendations:
-                        # Format potential connections for recommendation
-                        connections_data = ""
-                        for conn in potential_connections:
-                            if isinstance(conn, dict):
-                                handle = conn.get("handle", "")
-                                name = conn.get("name", "")
-                                posts = conn.get("posts", [])
-                                
-                                connections_data += f"User: {handle} ({name})\n"
-                                connections_data += f"Posts:\n" + "\n".join(posts[:2]) + "\n\n"  # Limit to 2 posts
-                        
-                        # Get recommendations from Gemini
-                        if connections_data and st.session_state.bluesky_interests:
-                            recommendations = suggest_connections(
-                                model, 
-                                st.session_state.bluesky_interests, 
-                                connections_data
-                            )
-                            st.session_state.bluesky_recommendations = recommendations
-                    
-                    # Display recommendations
-                    st.subheader("Recommended Bluesky Connections")
-                    if st.session_state.bluesky_recommendations:
-                        st.markdown(st.session_state.bluesky_recommendations)
-                    else:
-                        st.info("No Bluesky recommendations available yet.")
-                    
-                    # Add refresh button
-                    if st.button("Refresh Bluesky Recommendations"):
-                        st.session_state.bluesky_interests = ""
-                        st.session_state.bluesky_recommendations = []
+        # Interests and recommendations are generated by background jobs; results
+        # land in session state once the job finishes
+        def load_recommendations(platform):
+            def on_done(job):
+                st.session_state[f"{platform}_interests"] = job["result"]["interests"]
+                st.session_state[f"{platform}_recommendations"] = job["result"]["recommendations"]
+                if platform == "bluesky":
+                    st.session_state.bluesky_similar_accounts = job["result"].get("similar_accounts", [])
+                if platform == "reddit":
+                    st.session_state.reddit_communities = job["result"].get("communities", [])
+                    st.session_state.reddit_similar_users = job["result"].get("similar_users", [])
+            return on_done
+        
+        def show_partial_recommendations(result):
+            st.write(result.get("interests", ""))
+            st.markdown(result.get("recommendations", ""))
+        
+        # For Bluesky
+        with bluesky_tab:
+            if has_bluesky_data:
+                job = show_job_status("bluesky_recommendations", on_done=load_recommendations("bluesky"),
+                                      render_partial=show_partial_recommendations)
+                if not st.session_state.bluesky_interests:
+                    # Show precomputed results right away; refresh them in the background when stale
+                    stored, stale = get_stored_recommendations(st.session_state.username, "bluesky",
+                                                               llm_available=bool(gemini_api_key))
+                    if stored:
+                        load_recommendations("bluesky")({"result": stored})
+                    if (stale if stored else job is None) and not is_active(job):
+                        submit_job(st.session_state.username, "bluesky_recommendations",
+                                   api_key=gemini_api_key, temperature=temperature)
                         st.rerun()
+                
+                # Display interests
+                st.subheader("Your Bluesky Interests")
+                st.write(st.session_state.bluesky_interests)
+                
+                # Display recommendations
+                st.subheader("Recommended Bluesky Connections")
+                if st.session_state.bluesky_recommendations:
+                    st.markdown(st.session_state.bluesky_recommendations)
                 else:
-                    st.info("No Bluesky data available. Please fetch data from the User Details page.")
-            
-            # For Reddit
-            with reddit_tab:
-                if has_reddit_data:
-                    # Generate interests if not already done
-                    if not st.session_state.reddit_interests:
-                        # Prepare data for analysis
-                        subreddit_data = []
-                        for sub in reddit_subs[:10]:  # Limit to first 10 for performance
-                            if isinstance(sub, dict):
-                                name = sub.get("name", "")
-                                description = sub.get("description", "")
-                                subreddit_data.append(f"r/{name}: {description}")
-                        
-                        if subreddit_data:
-                            # Extract interests using Gemini
-                            st.session_state.reddit_interests = analyze_interests(model, "\n".join(subreddit_data))
-                    
-                    # Display interests
-                    st.subheader("Your Reddit Interests")
-                    st.write(st.session_state.reddit_interests)
-                    
-                    # Generate recommendations if not already done
-                    if not st.session_state.reddit_recommendations:
-                        # Format subreddit data for recommendation
-                        subreddit_info = ""
-                        for sub in reddit_subs:
-                            if isinstance(sub, dict):
-                                name = sub.get("name", "")
-                                description = sub.get("description", "")
-                                subscribers = sub.get("subscribers", "Unknown")
-                                
-                                subreddit_info += f"Subreddit: r/{name}\n"
-                                subreddit_info += f"Subscribers: {subscribers}\n"
-                                subreddit_info += f"Description: {description}\n\n"
-                        
-                        # Get recommendations from Gemini
-                        if subreddit_info and st.session_state.reddit_interests:
-                            # Custom prompt for Reddit recommendations
-                            prompt = f"""
-                            Based on the following interests:
-                            {st.session_state.reddit_interests}
-                            
-                            And these subreddits the user is subscribed to:
-                            {subreddit_info}
-                            
-                            Suggest 5 people/accounts they might want to follow on Reddit based on these interests.
-                            For each suggestion:
-                            1. Provide a username (can be fictional but realistic)
-                            2. Explain why they would be a good connection
-                            3. Mention which subreddits they're likely active in
-                            
-                            Format each suggestion with a clear heading and bullet points.
-                            """
-                            
-                            try:
-                                response = model.generate_content(prompt)
-                                st.session_state.reddit_recommendations = response.text
-                            except Exception as e:
-                                st.session_state.reddit_recommendations = "Could not generate Reddit recommendations at this time."
-                    
-                    # Display recommendations
-                    st.subheader("Recommended Reddit Connections")
-                    if st.session_state.reddit_recommendations:
-                        st.markdown(st.session_state.reddit_recommendations)
-                    else:
-                        st.info("No Reddit recommendations available yet.")
-                    
-                    # Add refresh button
-                    if st.button("Refresh Reddit Recommendations"):
-                        st.session_state.reddit_interests = ""
-                        st.session_state.reddit_recommendations = []
+                    st.info("No Bluesky recommendations available yet.")
+                
+                # Display accounts followed by the closest users in the interest index
+                if st.session_state.get("bluesky_similar_accounts"):
+                    st.subheader("Followed by Users Like You")
+                    for account in st.session_state.bluesky_similar_accounts:
+                        st.markdown(f"- [@{account['handle']}](https://bsky.app/profile/{account['handle']}) "
+                                    f"{account.get('display_name') or ''} "
+                                    f"(followed by {account['followed_by']} similar users)")
+                
+                # Add refresh button
+                if st.button("Refresh Bluesky Recommendations"):
+                    st.session_state.bluesky_interests = ""
+                    st.session_state.bluesky_recommendations = []
+                    st.session_state.bluesky_similar_accounts = []
+                    submit_job(st.session_state.username, "bluesky_recommendations",
+                               api_key=gemini_api_key, temperature=temperature)
+                    st.rerun()
+            else:
+                st.info("No Bluesky data available. Please fetch data from the User Details page.")
+        
+        # For Reddit
+        with reddit_tab:
+            if has_reddit_data:
+                job = show_job_status("reddit_recommendations", on_done=load_recommendations("reddit"),
+                                      render_partial=show_partial_recommendations)
+                if not st.session_state.reddit_interests:
+                    # Show precomputed results right away; refresh them in the background when stale
+                    stored, stale = get_stored_recommendations(st.session_state.username, "reddit",
+                                                               llm_available=bool(gemini_api_key))
+                    if stored:
+                        load_recommendations("reddit")({"result": stored})
+                    if (stale if stored else job is None) and not is_active(job):
+                        submit_job(st.session_state.username, "reddit_recommendations",
+                                   api_key=gemini_api_key, temperature=temperature)
                         st.rerun()
+                
+                # Display interests
+                st.subheader("Your Reddit Interests")
+                st.write(st.session_state.reddit_interests)
+                
+                # Display recommendations
+                st.subheader("Recommended Reddit Connections")
+                if st.session_state.reddit_recommendations:
+                    st.markdown(st.session_state.reddit_recommendations)
                 else:
-                    st.info("No Reddit data available. Please fetch data from the User Details page.")
+                    st.info("No Reddit recommendations available yet.")
+                
+                # Display co-membership results computed from every user's subscriptions
+                if st.session_state.get("reddit_communities"):
+                    st.subheader("Communities Joined by Users Like You")
+                    for community in st.session_state.reddit_communities:
+                        st.markdown(f"- [r/{community['name']}](https://www.reddit.com/r/{community['name']}) "
+                                    f"(similarity {community['score']:.2f})")
+                if st.session_state.get("reddit_similar_users"):
+                    st.subheader("Like-Minded Members")
+                    for member in st.session_state.reddit_similar_users:
+                        st.markdown(f"- {member['username']} ({member['score']:.0%} subscription overlap)")
+                
+                # Add refresh button
+                if st.button("Refresh Reddit Recommendations"):
+                    st.session_state.reddit_interests = ""
+                    st.session_state.reddit_recommendations = []
+                    st.session_state.reddit_communities = []
+                    st.session_state.reddit_similar_users = []
+                    submit_job(st.session_state.username, "reddit_recommendations",
+                               api_key=gemini_api_key, temperature=temperature)
+                    st.rerun()
+            else:
+                st.info("No Reddit data available. Please fetch data from the User Details page.")
 
 elif selected == "Chatbot":
     if not st.session_state.username:
@@ -617,12 +592,8 @@ elif selected == "Chatbot":
         st.write("Ask about **interests, topics, or specific types of accounts you'd like to follow on Bluesky or Reddit.**")
         
         # Check if we have data to work with
-        if not st.session_state.following:
-            following_data = get_following_data(st.session_state.username)
-            if following_data:
-                st.session_state.following = following_data
-            else:
-                st.info("No following data available. Please fetch data from the User Details page.")
+        if not count_following_data(st.session_state.username):
+            st.info("No following data available. Please fetch data from the User Details page.")
         
         if not st.session_state.potential_connections:
             connections_data = get_potential_connections(st.session_state.username)
@@ -631,7 +602,7 @@ elif selected == "Chatbot":
                 st.session_state.interests_analyzed = True
         
         # Check for Reddit data
-        if not st.session_state.reddit_subscriptions:
+        if not st.session_state.get("reddit_subscriptions"):
             reddit_subs = get_reddit_subscriptions(st.session_state.username)
             if reddit_subs:
                 st.session_state.reddit_subscriptions = reddit_subs
@@ -690,23 +661,18 @@ elif selected == "Chatbot":
             with st.spinner("Analyzing your network..."):
                 try:
                     # Set up Gemini
-                    model = setup_gemini(gemini_api_key, temperature)
-                    
-                    # Prepare data for analysis
-                    all_posts_data = []
-                    if isinstance(st.session_state.following[0], dict):
-                        # Data is from database, we need to get posts
-                        if st.session_state.client:
-                            for follow in st.session_state.following[:5]:
-                                posts = get_user_posts(st.session_state.client, follow["did"], limit=5)
-                                for post in posts:
-                                    if hasattr(post.post, 'record') and hasattr(post.post.record, 'text'):
-                                        all_posts_data.append(f"{follow['handle']}: {post.post.record.text}")
+                    model = get_gemini_model(gemini_api_key, temperature)
                     
-                    # Analyze interests if we have post data
-                    if all_posts_data:
-                        my_interests = analyze_interests(model, "\n".join(all_posts_data))
+                    # Stored interest profiles need no Gemini call; otherwise analyze the stored posts
+                    my_interests = ""
+                    stored_topics = profile_topics(st.session_state.username)
+                    if stored_topics:
+                        my_interests = format_interests(stored_topics[:MAX_TOPICS])
                     else:
+                        corpus = interest_corpus(st.session_state.username, "bluesky")
+                        if corpus:
+                            my_interests = analyze_interests(model, corpus)
+                    if not my_interests:
                         my_interests = "Could not analyze interests from available data."
                     
                     # Add initial message from assistant
@@ -750,32 +716,17 @@ What kind of friends would you like to connect with on Bluesky or Reddit?"""
             
             try:
                 # Generate response
-                model = setup_gemini(gemini_api_key, temperature)
+                model = get_gemini_model(gemini_api_key, temperature)
                 
-                # Format potential connections data for Bluesky
-                bluesky_connections_data = ""
-                if st.session_state.potential_connections:
-                    bluesky_connections_data = "BLUESKY CONNECTIONS:\n"
-                    for conn in st.session_state.potential_connections:
-                        if isinstance(conn, dict):
-                            handle = conn.get("handle", "")
-                            name = conn.get("name", "")
-                            posts = conn.get("posts", [])
-                        else:
-                            handle = conn.handle
-                            name = conn.display_name
-                            posts = []
-                        
-                        bluesky_connections_data += f"User: {handle} ({name})\n"
-                        bluesky_connections_data += f"Posts:\n" + "\n".join(posts) + "\n\n"
-                
-                # Format Reddit subscriptions data
-                reddit_data = ""
-                if hasattr(st.session_state, 'reddit_subscriptions') and st.session_state.reddit_subscriptions:
-                    reddit_data = "REDDIT SUBSCRIPTIONS:\n"
-                    for sub in st.session_state.reddit_subscriptions[:10]:  # Limit to 10 for performance
-                        reddit_data += f"Subreddit: r/{sub.get('name', '')}\n"
-                        reddit_data += f"Description: {sub.get('description', '')}\n\n"
+                # Retrieve only the connections and subreddits relevant to this query (including
+                # accounts from the full-text index over every crawled post), packed within a fixed token budget
+                bluesky_connections_data, reddit_data = build_chat_context(
+                    user_input,
+                    retrieve_candidates(user_input, st.session_state.username,
+                                        [conn for conn in st.session_state.potential_connections if isinstance(conn, dict)]),
+                    st.session_state.get("reddit_subscriptions") or [],
+                    token_budget=chat_token_budget
+                )
                 
                 # Create improved prompt for the chatbot
                 combined_prompt = f"""You are a friend recommendation expert for both Bluesky and Reddit social networks.
@@ -800,17 +751,13 @@ INSTRUCTIONS:
 - Do not engage in small talk or answer questions outside the scope of friend recommendations
 """
                 
-                # Generate response based on user input
-                response = model.generate_content(combined_prompt)
-                response_text = response.text
+                # Stream the response so the first tokens show up right away
+                with st.chat_message("assistant"):
+                    response_text = st.write_stream(stream_text(model, combined_prompt, use_cache=False))
                 
-                # Add assistant response to chat history
+                # Add assistant response to chat history once it is complete
                 st.session_state.messages.append({"role": "assistant", "content": response_text})
                 
-                # Display assistant's response
-                with st.chat_message("assistant"):
-                    st.markdown(response_text)
-                
             except Exception as e:
                 # Fallback response if Gemini fails
                 fallback = "I'm having trouble processing that request. Could you try asking about specific interests you'd like to explore on Bluesky or Reddit?"
@@ -818,9 +765,6 @@ INSTRUCTIONS:
                 
                 with st.chat_message("assistant"):
                     st.markdown(fallback)
-            
-            # Force a rerun to update the chat
-            st.rerun()
 
 elif selected == "About":
     st.title("ℹ️ About Friend Recommender AI")
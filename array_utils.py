@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def number_ids(values):
+    """
+    Number distinct values in first-seen order. Returns (distinct values,
+    {value: number}, int32 array with the number of every value). Values are
+    numbered and looked up in C (dict.fromkeys, map), not one by one in Python.
+    """
+    values = list(values)
+    distinct = list(dict.fromkeys(values))
+    index = {value: i for i, value in enumerate(distinct)}
+    return distinct, index, np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+def top_indices(scores, k=None, candidates=None):
+    """
+    Indices of the k highest scores (every one if k is None), best first.
+    candidates restricts the result to those indices. Only the top k are
+    sorted, after an O(n) partition.
+    """
+    candidates = np.arange(len(scores)) if candidates is None else np.asarray(candidates)
+    if k is not None and k < len(candidates):
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]] if k > 0 else candidates[:0]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
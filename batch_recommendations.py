@@ -0,0 +1,123 @@
+"""
+Precompute Bluesky and Reddit recommendations for every registered user, so
+the Recommendations page can show them without waiting for Gemini. Run it on a
+schedule (e.g. a nightly cron job):
+
+    python batch_recommendations.py [--workers 4] [--platforms bluesky reddit] [--max-age 86400] [--force]
+
+Interests for every pending user are extracted first, several users per
+Gemini request (--interest-batch-size), so the per-user jobs find them cached.
+The follow graph and the Reddit community index are built once per run and
+shared by every user's job.
+The Gemini API key is read from --api-key or the GEMINI_API_KEY environment
+variable. Without one, interests and recommendations are computed locally.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from clients import get_gemini_model
+from communities import load_community_index
+from database import init_db, get_usernames, get_potential_connections, get_reddit_subscriptions
+from gemini_helper import analyze_interests_batch, INTEREST_BATCH_SIZE, MAX_CONCURRENT_REQUESTS
+from graph import load_follow_graph
+from jobs import (
+    get_stored_recommendations, interest_corpus, recommend_bluesky, recommend_reddit, RECOMMENDATIONS_MAX_AGE
+)
+
+HANDLERS = {"bluesky": recommend_bluesky, "reddit": recommend_reddit}
+
+
+def has_data(username, platform):
+    if platform == "bluesky":
+        return bool(get_potential_connections(username, limit=1, posts_limit=0))
+    return bool(get_reddit_subscriptions(username, limit=1))
+
+
+def pending_tasks(platforms, max_age, force=False, llm_available=False):
+    # (username, platform) pairs with data to analyze and no fresh stored result
+    tasks = []
+    for username in get_usernames():
+        for platform in platforms:
+            if not has_data(username, platform):
+                continue
+            if force or get_stored_recommendations(username, platform, max_age, llm_available)[1]:
+                tasks.append((username, platform))
+    return tasks
+
+
+def prefetch_interests(tasks, api_key, temperature, batch_size):
+    # Warm the response cache the handlers' extract_interests calls read from
+    corpora = {task: interest_corpus(*task) for task in tasks}
+    corpora = {task: corpus for task, corpus in corpora.items() if corpus}
+    model = get_gemini_model(api_key, temperature)
+    return analyze_interests_batch(model, corpora, batch_size=batch_size, max_concurrency=MAX_CONCURRENT_REQUESTS)
+
+
+def shared_indexes(platforms):
+    # Extra handler keyword arguments per platform, built once for the whole run
+    indexes = {}
+    if "bluesky" in platforms:
+        indexes["bluesky"] = {"graph": load_follow_graph()}
+    if "reddit" in platforms:
+        indexes["reddit"] = {"index": load_community_index()}
+    return indexes
+
+
+def refresh(username, platform, api_key, temperature, indexes=None):
+    # The job handlers store their own results in the recommendations table
+    result = HANDLERS[platform](lambda *args, **kwargs: None, username, api_key=api_key, temperature=temperature,
+                                **(indexes or {}).get(platform, {}))
+    return bool(result.get("interests"))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--platforms", nargs="+", choices=sorted(HANDLERS), default=sorted(HANDLERS))
+    parser.add_argument("--max-age", type=float, default=RECOMMENDATIONS_MAX_AGE,
+                        help="Seconds after which stored recommendations are recomputed")
+    parser.add_argument("--force", action="store_true", help="Recompute even fresh recommendations")
+    parser.add_argument("--api-key", default=os.getenv("GEMINI_API_KEY"))
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--interest-batch-size", type=int, default=INTEREST_BATCH_SIZE,
+                        help="Users per interest extraction request (1 disables batching)")
+    args = parser.parse_args()
+    if not args.api_key:
+        print("No Gemini API key: extracting interests and recommendations locally")
+
+    init_db()
+    tasks = pending_tasks(args.platforms, args.max_age, args.force, llm_available=bool(args.api_key))
+    print(f"Refreshing {len(tasks)} stale recommendation sets with {args.workers} workers")
+
+    started = time.monotonic()
+    if args.api_key and args.interest_batch_size > 1 and tasks:
+        interests = prefetch_interests(tasks, args.api_key, args.temperature, args.interest_batch_size)
+        print(f"Extracted interests for {len(interests)} users in {time.monotonic() - started:.1f}s")
+
+    indexes = shared_indexes({platform for _, platform in tasks})
+    stored = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(refresh, username, platform, args.api_key, args.temperature, indexes):
+                   (username, platform) for username, platform in tasks}
+        for future in as_completed(futures):
+            username, platform = futures[future]
+            try:
+                if future.result():
+                    stored += 1
+                else:
+                    failed += 1
+                    print(f"{username} ({platform}): no interests could be extracted, nothing stored")
+            except Exception as e:
+                failed += 1
+                print(f"{username} ({platform}) failed: {e}")
+
+    print(f"Stored {stored}, failed {failed} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Load, build and query time of the Reddit co-membership index on synthetic subscriptions.
+
+    python benchmarks/bench_communities.py [--users 100000] [--subreddits 50000] [--per-user 20]
+
+The load timings store the subscriptions in a temporary database and read them
+back through load_community_index(), as Reddit recommendation jobs do.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import communities
+import database
+from communities import CommunityIndex
+
+
+def synthetic_memberships(users, subreddits, per_user, seed=0):
+    # Zipf-like subreddit popularity, a fixed number of subscriptions per user
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(users, dtype=np.int32), per_user)
+    cols = (rng.pareto(1.1, users * per_user) * subreddits / 100).astype(np.int64) % subreddits
+    return rows, cols.astype(np.int32)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def time_load(rows, cols, users, per_user):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        with database.transaction():  # One commit for every user's save
+            for user in range(users):
+                database.save_reddit_subscriptions(
+                    f"user{user}", [{"name": f"r{c}"} for c in cols[user * per_user:(user + 1) * per_user].tolist()])
+
+        index, cold = timed(communities.load_community_index)
+        _, warm = timed(communities.load_community_index)
+        database.save_reddit_subscriptions("user0", [{"name": "r0"}])
+        _, stale = timed(communities.load_community_index)
+        print(f"load_community_index: {index.members.nnz} memberships, {cold:.2f}s cold, "
+              f"{warm * 1000:.1f} ms cached, {stale:.2f}s after a subscription write")
+        database.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--subreddits", type=int, default=50_000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    rows, cols = synthetic_memberships(args.users, args.subreddits, args.per_user)
+    index, build_time = timed(CommunityIndex, range(args.users), range(args.subreddits), rows, cols)
+    print(f"index: {args.users} users x {args.subreddits} subreddits, {index.members.nnz} memberships, "
+          f"{index.similarity.nnz} similarity entries, built in {build_time:.2f}s")
+
+    users = np.random.default_rng(1).integers(0, args.users, args.queries)
+    for name, query in (("communities", index.recommend_communities), ("similar users", index.similar_users)):
+        times = [timed(query, int(user))[1] for user in users]
+        print(f"{name:>14}: {np.median(times) * 1000:7.2f} ms median, {np.percentile(times, 99) * 1000:7.2f} ms p99")
+
+    time_load(rows, cols, args.users, args.per_user)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Reads/sec of the Chat page queries under N concurrent sessions, comparing
+the old connect-per-call behaviour with the pooled WAL connection layer.
+
+    python benchmarks/bench_database.py [--users 200] [--seconds 3]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@contextmanager
+def _connect_per_call():
+    # What every database.py function did before the pool existed
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.create_function('post_text', 1, database._decode_post, deterministic=True)
+    try:
+        yield conn.cursor()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def populate(users, follows_per_user=300, candidates_per_user=30):
+    for u in range(users):
+        username = f"user{u}"
+        with database.transaction():
+            database.save_following_data(username, [
+                {"did": f"did:plc:{u}-{i}", "handle": f"h{u}-{i}.bsky.social", "display_name": f"Name {i}"}
+                for i in range(follows_per_user)
+            ])
+            database.save_potential_connections(username, [
+                {"did": f"did:plc:c{u}-{i}", "handle": f"c{u}-{i}.bsky.social", "name": f"Cand {i}",
+                 "posts": [f"post {j} about topic {i % 7}" for j in range(3)]}
+                for i in range(candidates_per_user)
+            ])
+            database.save_reddit_subscriptions(username, [
+                {"name": f"sub{i}", "url": f"https://www.reddit.com/r/sub{i}", "subscribers": i, "description": "d"}
+                for i in range(20)
+            ])
+
+
+def run(sessions, users, seconds, with_writer):
+    stop = time.monotonic() + seconds
+    counts = [0] * sessions
+
+    def reader(index):
+        n = 0
+        while time.monotonic() < stop:
+            username = f"user{(index * 7919 + n) % users}"
+            database.get_following_data(username)
+            database.get_potential_connections(username)
+            database.get_reddit_subscriptions(username)
+            n += 1
+        counts[index] = n * 3
+
+    def writer():
+        n = 0
+        while time.monotonic() < stop:
+            database.save_user(f"writer{n % 50}", "pw")
+            n += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(sessions)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    pooled_borrow = database._borrow
+    print(f"{'sessions':>8} {'writer':>6} {'before reads/s':>15} {'after reads/s':>14} {'speedup':>8}")
+
+    for with_writer in (False, True):
+        for sessions in args.sessions:
+            results = []
+            for borrow, wal in ((_connect_per_call, False), (pooled_borrow, True)):
+                with tempfile.TemporaryDirectory() as tmp:
+                    database.close_connections()
+                    database.DB_PATH = os.path.join(tmp, "bench.db")
+                    database._borrow = pooled_borrow
+                    database.init_db()
+                    populate(args.users)
+                    database.close_connections()
+                    if not wal:
+                        conn = sqlite3.connect(database.DB_PATH)
+                        conn.execute("PRAGMA journal_mode=DELETE")
+                        conn.close()
+                    database._borrow = borrow
+                    results.append(run(sessions, args.users, args.seconds, with_writer))
+                    database._borrow = pooled_borrow
+                    database.close_connections()
+            before, after = results
+            print(f"{sessions:>8} {'yes' if with_writer else 'no':>6} {before:>15.0f} {after:>14.0f} {after / before:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
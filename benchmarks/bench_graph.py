@@ -0,0 +1,83 @@
+"""
+Load, build and scoring time of the follow graph engine on a synthetic power-law graph.
+
+    python benchmarks/bench_graph.py [--nodes 500000] [--edges 3000000]
+
+The load timings store the graph as crawled follower edges in a temporary
+database and read it back through load_follow_graph(), as recommendation jobs do.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import graph as graph_engine
+from graph import FollowGraph
+
+
+def synthetic_edges(nodes, edges, seed=0):
+    # Followers uniform, followees Zipf-like so a few accounts collect most follows
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, nodes, edges, dtype=np.int32)
+    targets = (rng.pareto(1.2, edges) * nodes / 50).astype(np.int64) % nodes
+    return sources, targets.astype(np.int32)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def time_load(sources, targets, nodes):
+    dids = [f"did:plc:{i:024d}" for i in range(nodes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        order = np.argsort(targets, kind="stable")
+        followees, starts = np.unique(targets[order], return_index=True)
+        with database.transaction():  # One commit for every followee's save
+            for followee, followers in zip(followees.tolist(), np.split(sources[order], starts[1:])):
+                database.save_follower_edges(dids[followee], [dids[f] for f in followers.tolist()])
+
+        graph, cold = timed(graph_engine.load_follow_graph)
+        _, warm = timed(graph_engine.load_follow_graph)
+        database.save_follower_edges(dids[0], dids[1:10])
+        _, stale = timed(graph_engine.load_follow_graph)
+        print(f"load_follow_graph: {graph.edge_count} edges, {cold:.2f}s cold, {warm * 1000:.1f} ms cached, "
+              f"{stale:.2f}s after an edge write")
+        database.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=500_000)
+    parser.add_argument("--edges", type=int, default=3_000_000)
+    parser.add_argument("--queries", type=int, default=5)
+    args = parser.parse_args()
+
+    sources, targets = synthetic_edges(args.nodes, args.edges)
+    graph, build_time = timed(FollowGraph, range(args.nodes), sources, targets)
+    print(f"graph: {len(graph)} nodes, {graph.edge_count} edges, built in {build_time:.2f}s")
+
+    rng = np.random.default_rng(1)
+    for method in ("mutual", "adamic_adar", "pagerank"):
+        scorer = {"mutual": graph.mutual_counts, "adamic_adar": graph.adamic_adar,
+                  "pagerank": graph.personalized_pagerank}[method]
+        times = [timed(scorer, int(node))[1] for node in rng.integers(0, args.nodes, args.queries)]
+        print(f"{method:>12}: {np.median(times) * 1000:8.1f} ms median over {args.queries} users")
+
+    times = [timed(graph.recommend, int(node), top_k=50)[1] for node in rng.integers(0, args.nodes, args.queries)]
+    print(f"{'recommend':>12}: {np.median(times) * 1000:8.1f} ms median (adamic_adar + mutual, top 50)")
+
+    time_load(sources, targets, args.nodes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Query latency and recall of the IVF similar-user index against an exact scan.
+
+    python benchmarks/bench_interest_index.py [--users 100000] [--nprobe 8]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interest_index import InterestIndex, VECTOR_DIM
+
+
+def synthetic_vectors(users, dim, topics=200, seed=0):
+    # Users mix a handful of shared topic directions, like real interest profiles
+    rng = np.random.default_rng(seed)
+    topic_vectors = rng.standard_normal((topics, dim)).astype(np.float32)
+    mixes = rng.dirichlet(np.full(topics, 0.05), users).astype(np.float32)
+    vectors = mixes @ topic_vectors + 0.1 * rng.standard_normal((users, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.users, VECTOR_DIM)
+    index = InterestIndex()
+    started = time.perf_counter()
+    for i, vector in enumerate(vectors):
+        index.add(i, vector)
+    insert_time = time.perf_counter() - started
+    started = time.perf_counter()
+    index.train()
+    print(f"{args.users} users: inserted in {insert_time:.2f}s, trained {len(index.centroids)} lists "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    queries = np.random.default_rng(1).integers(0, args.users, args.queries)
+    for label, nprobe in (("exact scan", len(index.centroids)), ("ivf", args.nprobe)):
+        times, recalls = [], []
+        for user in queries:
+            started = time.perf_counter()
+            found = index.search(vectors[user], args.top_k, nprobe=nprobe, exclude=int(user))
+            times.append(time.perf_counter() - started)
+            exact = index.search(vectors[user], args.top_k, nprobe=len(index.centroids), exclude=int(user))
+            recalls.append(len({u for u, _ in found} & {u for u, _ in exact}) / args.top_k)
+        print(f"{label:>10} (nprobe={nprobe}): {np.median(times) * 1000:6.2f} ms median, "
+              f"{np.percentile(times, 99) * 1000:6.2f} ms p99, recall@{args.top_k} {np.mean(recalls):.2f}")
+
+
+if __name__ == "__main__":
+    main()
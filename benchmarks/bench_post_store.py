@@ -0,0 +1,92 @@
+"""
+Size and scan speed of the compressed post store on a synthetic crawl.
+
+    python benchmarks/bench_post_store.py [--accounts 20000] [--posts-per-account 10] [--corpus posts.txt]
+
+Posts are drawn from --corpus (one post per line), or generated from a
+Zipf-distributed vocabulary, which compresses better than real posts do.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import post_store
+
+VOCABULARY = [f"word{i}" for i in range(20000)] + ["rust", "python", "photography", "gardening", "jazz"]
+
+
+def synthetic_posts(count, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(VOCABULARY) + 1)
+    weights /= weights.sum()
+    words = rng.choice(len(VOCABULARY), (count, 24), p=weights)
+    return [" ".join(VOCABULARY[w] for w in row) for row in words]
+
+
+def crawl(accounts, posts_per_account, texts, shift=0):
+    # Each account's newest posts; shift drops the oldest ones and adds as many new ones
+    return [{"did": f"did:plc:{i:024d}", "handle": f"h{i}.bsky.social", "name": f"Name {i}",
+             "posts": [texts[(i * posts_per_account + j + shift) % len(texts)] for j in range(posts_per_account)],
+             "post_uris": [f"at://did:plc:{i:024d}/app.bsky.feed.post/3l{j + shift:011d}"
+                           for j in range(posts_per_account)]}
+            for i in range(accounts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=20_000)
+    parser.add_argument("--posts-per-account", type=int, default=10)
+    parser.add_argument("--corpus", help="Text file with one post per line")
+    args = parser.parse_args()
+
+    total = args.accounts * args.posts_per_account
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = synthetic_posts(total)
+    raw_bytes = sum(len(text.encode("utf-8")) for text in texts[:total])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        for label, shift in (("crawl", 0), ("re-crawl, nothing new", 0), ("re-crawl, half new", args.posts_per_account // 2)):
+            started = time.perf_counter()
+            database.save_potential_connections("user", crawl(args.accounts, args.posts_per_account, texts, shift))
+            print(f"{label:>22}: {time.perf_counter() - started:6.2f}s")
+
+        started = time.perf_counter()
+        dictionary_id, rewritten = post_store.compress_posts(vacuum=True)
+        print(f"{'retrain + recompress':>22}: {time.perf_counter() - started:6.2f}s ({rewritten} posts rewritten)")
+
+        started = time.perf_counter()
+        scanned = sum(len(rows) for rows in database.iter_posts())
+        print(f"{'full scan':>22}: {time.perf_counter() - started:6.2f}s ({scanned} posts)")
+
+        with database.connection() as c:
+            stored = c.execute('SELECT SUM(LENGTH(text)) FROM posts').fetchone()[0]
+            pages = dict(c.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall())
+        print(f"post text: {raw_bytes / 1e6:.1f} MB raw, {stored / 1e6:.1f} MB stored "
+              f"({raw_bytes / stored:.2f}x); posts table {pages.get('posts', 0) / 1e6:.1f} MB, "
+              f"search index {pages.get('posts_text_data', 0) / 1e6:.1f} MB, "
+              f"database {os.path.getsize(database.DB_PATH) / 1e6:.1f} MB")
+
+        try:
+            started = time.perf_counter()
+            path = os.path.join(tmp, "posts.parquet")
+            post_store.export_posts(path)
+            print(f"Parquet export: {time.perf_counter() - started:.2f}s, {os.path.getsize(path) / 1e6:.1f} MB")
+        except RuntimeError as e:
+            print(e)
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency of the FTS5 post and description search on a synthetic post store.
+
+    python benchmarks/bench_text_search.py [--accounts 200000] [--posts-per-account 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+VOCABULARY = [f"word{i}" for i in range(20000)] + ["rust", "python", "photography", "gardening", "jazz"]
+
+
+def populate(accounts, posts_per_account, seed=0):
+    rng = np.random.default_rng(seed)
+    # Zipf-like word frequencies, twelve words per post
+    weights = 1 / np.arange(1, len(VOCABULARY) + 1)
+    weights /= weights.sum()
+    batch = 5000
+    for start in range(0, accounts, batch):
+        words = rng.choice(len(VOCABULARY), (batch * posts_per_account, 12), p=weights)
+        with database.transaction():
+            database.save_potential_connections(f"user{start}", [
+                {"did": f"did:plc:{start + i}", "handle": f"h{start + i}.bsky.social", "name": f"Name {i}",
+                 "posts": [" ".join(VOCABULARY[w] for w in words[i * posts_per_account + j])
+                           for j in range(posts_per_account)]}
+                for i in range(min(batch, accounts - start))
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=200_000)
+    parser.add_argument("--posts-per-account", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        started = time.perf_counter()
+        populate(args.accounts, args.posts_per_account)
+        print(f"{args.accounts * args.posts_per_account} posts indexed in {time.perf_counter() - started:.1f}s")
+
+        queries = [["rust"], ["python", "jazz"], ["word5"], ["word15000", "gardening"], ["photography"]]
+        for terms in queries:
+            times = []
+            for _ in range(args.queries // len(queries)):
+                started = time.perf_counter()
+                results = database.search_accounts_text(terms, limit=30)
+                times.append(time.perf_counter() - started)
+            print(f"{' '.join(terms):>22}: {np.median(times) * 1000:7.2f} ms median, {len(results)} accounts")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
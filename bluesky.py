@@ -1,36 +1,186 @@
+import threading
+import time
+from concurrent.futures import Future
+
 from atproto import Client
 
-def get_following_list(client):
-    try:
-        # Get the user's DID (Decentralized Identifier)
-        profile = client.get_profile(client.me.did)
-        # Fetch following list
-        following = client.get_follows(actor=profile.did)
+from retry import call_with_retry
+
+FOLLOWS_PAGE_SIZE = 100  # Maximum page size accepted by app.bsky.graph.getFollows
+
+# Generator that walks the follows cursor and yields (page, next_cursor) one page at a time,
+# so callers can render and persist as pages arrive instead of holding every page, and
+# resume an interrupted walk by passing the last next_cursor back in (None after the last page).
+# A page that still fails after retries raises, so a partial list is never mistaken for the whole one.
+def iter_following_cursor_pages(client, actor=None, page_size=FOLLOWS_PAGE_SIZE, cursor=None):
+    actor = actor or client.me.did
+    while True:
+        response = call_with_retry(client.get_follows, actor=actor, cursor=cursor, limit=page_size,
+                                   platform="bluesky")
         
-        # Return the following list for further processing
-        return following.follows
-    except Exception as e:
-        print(f"Error fetching following list: {e}")
-        return []
+        cursor = response.cursor if response.follows else None
+        if response.follows:
+            yield response.follows, cursor
+        
+        if not cursor:
+            return
+
+def iter_following_pages(client, actor=None, page_size=FOLLOWS_PAGE_SIZE, cursor=None):
+    for page, _ in iter_following_cursor_pages(client, actor, page_size, cursor):
+        yield page
+
+# Generator over individual followed profiles across all pages
+def iter_following(client, actor=None, page_size=FOLLOWS_PAGE_SIZE):
+    for page in iter_following_pages(client, actor, page_size):
+        yield from page
+
+def get_following_list(client):
+    # Walk every page so accounts following more than one page are not truncated
+    return list(iter_following(client))
+
+# Follows come back newest first, so new follows since the last sync are the ones
+# before the first already-known DID. Returns (new_follows, reached_known_follow).
+def get_new_following(client, known_dids, actor=None, page_size=FOLLOWS_PAGE_SIZE):
+    new_follows = []
+    for follow in iter_following(client, actor, page_size):
+        if follow.did in known_dids:
+            return new_follows, True
+        new_follows.append(follow)
+    return new_follows, False
 
 # Function to get posts from a user to analyze interests
 def get_user_posts(client, user_did, limit=10):
     try:
-        posts = client.get_author_feed(actor=user_did, limit=limit)
+        posts = call_with_retry(client.get_author_feed, actor=user_did, limit=limit, platform="bluesky")
         return posts.feed
     except Exception as e:
         print(f"Error fetching posts: {e}")
         return []
 
+# Newest followers of an account; errors are raised for the caller to retry or skip
+def fetch_followers(client, user_did, limit=50):
+    return client.get_followers(actor=user_did, limit=limit).followers
+
 # Function to get followers of someone you follow
 def get_followers_of_following(client, user_did, limit=50):
     try:
-        followers = client.get_followers(actor=user_did, limit=limit)
-        return followers.followers
+        return call_with_retry(fetch_followers, client, user_did, limit, platform="bluesky")
     except Exception as e:
         print(f"Error fetching followers: {e}")
         return []
 
+PROFILES_BATCH_SIZE = 25  # Maximum actors accepted by app.bsky.actor.getProfiles
+
+HYDRATION_TTL = 10 * 60  # Seconds a hydrated profile, post or feed is reused
+HYDRATION_MAX_ENTRIES = 50000  # Expired entries are purged once a cache grows past this
+
+class HydrationCache:
+    """
+    Short-lived lookups keyed by DID or URI, shared by every thread and client.
+
+    Requested keys are de-duplicated, keys already cached are answered locally
+    and keys another thread is currently fetching are waited on instead of
+    requested again. Only the remaining keys reach fetch_batch, in batches of
+    batch_size. Failed lookups are not cached. fresh=True ignores cached
+    results (still joining in-flight requests) and caches what it fetches.
+    """
+    def __init__(self, ttl=HYDRATION_TTL, max_entries=HYDRATION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results = {}  # key -> (value, expires_at)
+        self._in_flight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def get_many(self, keys, fetch_batch, batch_size, fresh=False):
+        results = {}
+        waiting = {}
+        to_fetch = []
+        now = time.monotonic()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._results.get(key)
+                if entry and entry[1] > now and not fresh:
+                    results[key] = entry[0]
+                elif key in self._in_flight:
+                    waiting[key] = self._in_flight[key]
+                else:
+                    waiting[key] = self._in_flight[key] = Future()
+                    to_fetch.append(key)
+
+        try:
+            for start in range(0, len(to_fetch), batch_size):
+                batch = to_fetch[start:start + batch_size]
+                try:
+                    fetched = fetch_batch(batch)
+                except Exception as e:
+                    print(f"Error hydrating {len(batch)} items: {e}")
+                    fetched = {}
+                expires_at = time.monotonic() + self.ttl
+                with self._lock:
+                    for key in batch:
+                        value = fetched.get(key)
+                        if value is not None:
+                            self._results[key] = (value, expires_at)
+                        self._in_flight.pop(key).set_result(value)
+                    if len(self._results) > self.max_entries:
+                        self._purge_expired()
+        finally:
+            # An interrupted call must not leave other callers waiting on keys it never fetched
+            with self._lock:
+                for key in to_fetch:
+                    if not waiting[key].done():
+                        self._in_flight.pop(key)
+                        waiting[key].set_result(None)
+
+        for key, future in waiting.items():
+            value = future.result()
+            if value is not None:
+                results[key] = value
+        return results
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+_profile_cache = HydrationCache()
+_feed_cache = HydrationCache()
+
+def _direct_call(client):
+    return lambda func, *args: call_with_retry(func, client, *args, platform="bluesky")
+
+def _fetch_profiles_batch(client, dids):
+    return {profile.did: profile for profile in client.get_profiles(actors=dids).profiles}
+
+def _fetch_author_feed(client, did, limit):
+    return client.get_author_feed(actor=did, limit=limit).feed
+
+# Hydrate detailed profiles for any number of DIDs: duplicates, recently hydrated and
+# in-flight DIDs cost nothing, the rest go out as getProfiles batches of 25.
+# call(func, *args) performs each request (the crawler passes its rate-limited wrapper).
+# fresh=True skips recently hydrated profiles, for callers comparing counters against a previous sync.
+def hydrate_profiles(client, dids, call=None, fresh=False):
+    call = call or _direct_call(client)
+    return _profile_cache.get_many(dids, lambda batch: call(_fetch_profiles_batch, batch), PROFILES_BATCH_SIZE,
+                                   fresh=fresh)
+
+# Recent author feeds as {did: feed}. There is no bulk author-feed endpoint, so this
+# only coalesces: each DID is requested once however many followees it was found through,
+# and concurrent callers asking for the same DID share a single request.
+def hydrate_author_feeds(client, dids, limit=10, call=None, fresh=False):
+    call = call or _direct_call(client)
+    feeds = _feed_cache.get_many(
+        [(did, limit) for did in dids],
+        lambda batch: {batch[0]: call(_fetch_author_feed, *batch[0])},
+        1,
+        fresh=fresh
+    )
+    return {did: feed for (did, _), feed in feeds.items()}
+
 def main():
     try:
         client = Client()
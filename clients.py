@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+
+import google.generativeai as genai
+from atproto import Client
+
+from database import get_bluesky_session, save_bluesky_session, delete_bluesky_session
+from gemini_helper import setup_gemini
+from reddit import get_reddit_client as create_reddit_client
+
+CLIENT_TTL = 30 * 60  # Seconds an unused client stays cached
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of expensive client objects (logged-in API clients,
+    model handles), shared by every Streamlit session and background job.
+
+    Entries expire after ttl seconds without use. Concurrent requests for the
+    same key wait for a single factory call instead of each logging in; the
+    per-key lock only lives while such calls are in progress.
+    """
+    def __init__(self, ttl=CLIENT_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._key_locks = {}  # key -> (lock, callers using it)
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            self._entries[key] = (entry[0], time.monotonic() + self.ttl)
+            return entry[0]
+        self._entries.pop(key, None)
+        return None
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+    def get(self, key, factory):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            key_lock, users = self._key_locks.get(key, (None, 0))
+            key_lock = key_lock or threading.Lock()
+            self._key_locks[key] = (key_lock, users + 1)
+
+        try:
+            with key_lock:
+                with self._lock:
+                    value = self._lookup(key)
+                if value is None:
+                    value = factory()
+                    with self._lock:
+                        self._purge_expired()
+                        self._entries[key] = (value, time.monotonic() + self.ttl)
+                return value
+        finally:
+            with self._lock:
+                key_lock, users = self._key_locks[key]
+                if users > 1:
+                    self._key_locks[key] = (key_lock, users - 1)
+                else:
+                    del self._key_locks[key]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+registry = ClientRegistry()
+_gemini_lock = threading.Lock()
+_configured_api_key = None
+
+
+def _credentials_key(*parts):
+    # Never keep raw passwords or API keys in cache keys
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def _login_bluesky(username, password, session_key):
+    client = Client()
+    session_string = get_bluesky_session(session_key)
+    if session_string:
+        try:
+            # Resuming only refreshes tokens when needed, avoiding a createSession call
+            client.login(session_string=session_string)
+        except Exception as e:
+            print(f"Could not resume Bluesky session: {e}")
+            delete_bluesky_session(session_key)
+            client = Client()
+            session_string = None
+    if not session_string:
+        client.login(username, password)
+
+    save_bluesky_session(session_key, client.export_session_string())
+    client.on_session_change(lambda event, session: save_bluesky_session(session_key, session.export()))
+    return client
+
+
+def get_bluesky_client(username, password):
+    """
+    Logged-in atproto Client for these credentials, resumed from the stored
+    session string when possible
+    """
+    key = _credentials_key("bluesky", username, password)
+    return registry.get(key, lambda: _login_bluesky(username, password, key))
+
+
+def _create_reddit_client(username, password):
+    reddit_client = create_reddit_client(username, password)
+    if reddit_client is None:
+        # Raising keeps the failure out of the registry
+        raise ValueError("Failed to initialize Reddit client")
+    return reddit_client
+
+
+def get_reddit_client(username, password):
+    """
+    PRAW instance for these credentials, or None if it cannot be created
+    """
+    key = _credentials_key("reddit", username, password)
+    try:
+        return registry.get(key, lambda: _create_reddit_client(username, password))
+    except ValueError:
+        return None
+
+
+def get_gemini_model(api_key, temperature=0.7):
+    """
+    Cached Gemini model for this key and temperature
+    """
+    global _configured_api_key
+    key = _credentials_key("gemini", api_key, temperature)
+    model = registry.get(key, lambda: setup_gemini(api_key, temperature))
+
+    # genai holds a single global configuration; only reconfigure when the key changes
+    with _gemini_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+    return model
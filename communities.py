@@ -0,0 +1,130 @@
+import numpy as np
+from scipy import sparse
+
+from array_utils import number_ids, top_indices
+from database import get_subreddit_memberships, VersionedCache, SUBREDDIT_MEMBERSHIP_DATA
+
+DEFAULT_TOP_K = 10
+NEIGHBORS_PER_SUBREDDIT = 100  # Similar subreddits kept per subreddit after pruning
+SIMILARITY_BLOCK = 2048  # Subreddit columns per block while computing similarities
+
+
+class CommunityIndex:
+    """
+    Subreddit co-membership index over every stored user's subscriptions.
+
+    Memberships form a binary user x subreddit sparse matrix. Item-item cosine
+    similarity is computed once, in column blocks pruned to the
+    NEIGHBORS_PER_SUBREDDIT closest subreddits, after which a user's community
+    recommendations are one sparse vector-matrix product. Like-minded users
+    are another product against the row-normalized matrix.
+    """
+    def __init__(self, users, subreddits, rows, cols, neighbors=NEIGHBORS_PER_SUBREDDIT):
+        """
+        rows and cols are integer membership arrays indexing into users and subreddits
+        """
+        self.users = list(users)
+        self.subreddits = list(subreddits)
+        self.user_index = {name: i for i, name in enumerate(self.users)}
+        self.subreddit_index = {name: i for i, name in enumerate(self.subreddits)}
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        shape = (len(self.users), len(self.subreddits))
+        members = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+        members.data[:] = 1  # Collapse duplicate memberships
+        self.members = members
+        self.member_counts = np.asarray(members.sum(axis=0)).ravel()
+        self.user_vectors = _normalize(members, axis=1)
+        self.similarity = _item_similarity(_normalize(members, axis=0).tocsc(), neighbors)
+
+    @classmethod
+    def from_memberships(cls, memberships, neighbors=NEIGHBORS_PER_SUBREDDIT):
+        """
+        Build from an iterable of (username, subreddit_name)
+        """
+        memberships = list(memberships)
+        users, _, rows = number_ids(username for username, _ in memberships)
+        subreddits, _, cols = number_ids(name for _, name in memberships)
+        return cls(users, subreddits, rows, cols, neighbors)
+
+    def _user_row(self, username):
+        return self.members.getrow(self.user_index[username])
+
+    def recommend_communities(self, username, top_k=DEFAULT_TOP_K):
+        """
+        Subreddits username is not in, scored by summed cosine similarity to
+        their subscriptions. Returns (name, score) pairs, best first.
+        """
+        if username not in self.user_index:
+            return []
+        row = self._user_row(username)
+        scores = (row @ self.similarity).toarray().ravel()
+        scores[row.indices] = 0
+        return _top(scores, top_k, self.subreddits)
+
+    def similar_users(self, username, top_k=DEFAULT_TOP_K):
+        """
+        Other users by cosine similarity of their subscriptions, as (username, score) pairs
+        """
+        if username not in self.user_index:
+            return []
+        row = self.user_vectors.getrow(self.user_index[username])
+        scores = (self.user_vectors @ row.T).toarray().ravel()
+        scores[self.user_index[username]] = 0
+        return _top(scores, top_k, self.users)
+
+
+def _normalize(matrix, axis):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=axis)).ravel())
+    norms[norms == 0] = 1
+    scale = sparse.diags(1 / norms)
+    return (scale @ matrix if axis == 1 else matrix @ scale).tocsr()
+
+
+def _item_similarity(normalized, neighbors):
+    # Cosine similarity between subreddit columns, one block of columns at a time so
+    # the dense-ish co-membership counts of popular subreddits never exist all at once
+    n = normalized.shape[1]
+    transposed = normalized.T.tocsr()
+    blocks = []
+    for start in range(0, n, SIMILARITY_BLOCK):
+        block = (transposed @ normalized[:, start:start + SIMILARITY_BLOCK]).tocsc()
+        block.setdiag(0, k=-start)
+        blocks.append(_prune_columns(block, neighbors))
+    if not blocks:
+        return sparse.csr_matrix((n, n), dtype=np.float32)
+    return sparse.hstack(blocks).tocsr()
+
+
+def _prune_columns(block, neighbors):
+    # Keep the largest `neighbors` entries of each column
+    block.eliminate_zeros()
+    indptr, indices, data = [0], [], []
+    for col in range(block.shape[1]):
+        start, end = block.indptr[col], block.indptr[col + 1]
+        col_data = block.data[start:end]
+        keep = np.arange(start, end)
+        if end - start > neighbors:
+            keep = start + np.argpartition(-col_data, neighbors - 1)[:neighbors]
+        indices.append(block.indices[keep])
+        data.append(block.data[keep])
+        indptr.append(indptr[-1] + len(keep))
+    return sparse.csc_matrix(
+        (np.concatenate(data) if data else [], np.concatenate(indices) if indices else [], indptr),
+        shape=block.shape, dtype=np.float32
+    )
+
+
+def _top(scores, top_k, names):
+    return [(names[i], float(scores[i])) for i in top_indices(scores, top_k, np.flatnonzero(scores > 0))]
+
+
+_index_cache = VersionedCache(SUBREDDIT_MEMBERSHIP_DATA, lambda: CommunityIndex.from_memberships(get_subreddit_memberships()))
+
+
+def load_community_index():
+    """
+    Community index over every app user's stored Reddit subscriptions. It is
+    built once per process and rebuilt only after Reddit data was written.
+    """
+    return _index_cache.get()
@@ -0,0 +1,139 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bluesky import fetch_followers, hydrate_author_feeds, hydrate_profiles, PROFILES_BATCH_SIZE
+from retry import call_with_retry, RateLimiter
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_REQUESTS_PER_SECOND = 10
+
+
+class CrawlStats:
+    """
+    Counters for a single crawl, used to size concurrency and rate settings
+    """
+    def __init__(self):
+        self.pages = 0
+        self.retries = 0
+        self.failures = 0
+        self.started = time.monotonic()
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def add_page(self):
+        with self.lock:
+            self.pages += 1
+
+    def add_retry(self, error=None):
+        with self.lock:
+            self.retries += 1
+
+    def add_failure(self):
+        with self.lock:
+            self.failures += 1
+
+    def stop(self):
+        self.finished = time.monotonic()
+
+    @property
+    def wall_time(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def pages_per_sec(self):
+        wall_time = self.wall_time
+        return self.pages / wall_time if wall_time > 0 else 0.0
+
+    def summary(self):
+        summary = f"{self.pages} pages in {self.wall_time:.2f}s ({self.pages_per_sec:.1f} pages/sec)"
+        if self.retries or self.failures:
+            summary += f", {self.retries} retries, {self.failures} failed lookups (fetched again next time)"
+        return summary
+
+
+class NetworkCrawler:
+    """
+    Fan Bluesky follower and post lookups out over a bounded thread pool.
+
+    Every request goes through the retry layer and the process-wide Bluesky
+    rate limiter, which the crawl shares with every other Bluesky call;
+    requests_per_second further caps this crawl alone. Raising max_workers
+    only helps until the rate budget is exhausted. Profile and
+    post lookups go through the hydration layer in bluesky.py, so an account
+    reached through several followees (or another job) is requested once.
+    """
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS,
+                 requests_per_second=DEFAULT_REQUESTS_PER_SECOND):
+        self.client = client
+        self.max_workers = max(1, int(max_workers))
+        self.rate_cap = RateLimiter(requests_per_second)  # This crawl's own ceiling, below the shared budget
+        self.stats = CrawlStats()
+
+    def _call(self, func, *args, **kwargs):
+        self.rate_cap.acquire()
+        result = call_with_retry(func, self.client, *args, platform="bluesky",
+                                 on_retry=self.stats.add_retry, **kwargs)
+        self.stats.add_page()
+        return result
+
+    def _call_or_none(self, func, *args, **kwargs):
+        # Failed lookups are counted and left out of results rather than stored as empty
+        try:
+            return self._call(func, *args, **kwargs)
+        except Exception as e:
+            print(f"Error crawling {args[0] if args else ''}: {e}")
+            self.stats.add_failure()
+            return None
+
+    def fetch_posts(self, dids, limit=10, on_result=None, fresh=False):
+        """
+        Fetch the author feed of every DID concurrently, returned as {did: feed}.
+        DIDs whose feed could not be fetched are counted as failures and left
+        out. on_result(did, feed)
+        is called on the calling thread as each feed arrives. fresh=True
+        refetches feeds hydrated in the last few minutes.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(hydrate_author_feeds, self.client, [did], limit, self._call, fresh): did
+                       for did in dict.fromkeys(dids)}
+            for future in as_completed(futures):
+                # The hydration cache logs and drops a failed fetch, so a missing DID is a failure
+                feed = future.result().get(futures[future])
+                if feed is None:
+                    self.stats.add_failure()
+                    continue
+                results[futures[future]] = feed
+                if on_result:
+                    on_result(futures[future], feed)
+        return results
+
+    def fetch_followers(self, dids, limit=10, on_result=None):
+        """
+        Fetch the newest followers of every DID concurrently, returned as {did: followers}.
+        DIDs whose followers could not be fetched are left out. on_result(did, followers)
+        is called on the calling thread as each list arrives.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._call_or_none, fetch_followers, did, limit): did for did in dids}
+            for future in as_completed(futures):
+                if future.result() is not None:
+                    results[futures[future]] = future.result()
+                    if on_result:
+                        on_result(futures[future], future.result())
+        return results
+
+    def fetch_profiles(self, dids, fresh=False):
+        """
+        Fetch detailed profiles in getProfiles-sized batches, returned as
+        {did: profile}. fresh=True refetches profiles hydrated in the last few minutes.
+        """
+        dids = list(dict.fromkeys(dids))
+        batches = [dids[start:start + PROFILES_BATCH_SIZE] for start in range(0, len(dids), PROFILES_BATCH_SIZE)]
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for profiles in pool.map(lambda batch: hydrate_profiles(self.client, batch, self._call, fresh), batches):
+                results.update(profiles)
+        return results
@@ -1,65 +1,470 @@
 import sqlite3
 import os
 import json
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import post_codec
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bluesky_recommender.db')
 
+POOL_SIZE = 8  # Idle connections kept around for reuse across Streamlit script threads
+STATEMENT_CACHE_SIZE = 256  # Prepared statements cached per connection
+
+# Applied to every pooled connection. journal_mode=WAL is persisted in the file
+# and lets readers run while a writer holds the lock.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA busy_timeout=30000',
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()
+
+POST_URI_FORMAT = 'at://{did}/app.bsky.feed.post/{rkey}'
+DICTIONARY_MIN_POSTS = 2000  # Stored posts needed before a compression dictionary is trained
+DICTIONARY_SAMPLE = 20000  # Posts sampled to train one
+
+# Preset dictionaries post texts are compressed with, {id: bytes}, loaded on first use
+_post_dictionaries = {}
+_dictionary_lock = threading.Lock()
+
+def _load_post_dictionaries():
+    # Read through a separate connection: this also runs inside post_text() calls on pooled ones
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    try:
+        rows = conn.execute('SELECT id, dictionary FROM post_dictionaries').fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    with _dictionary_lock:
+        _post_dictionaries.update(rows)
+
+def _decode_post(value):
+    # SQL function post_text(): a stored post's text, whatever form it was saved in
+    try:
+        return post_codec.decode(value, _post_dictionaries)
+    except KeyError:
+        # Dictionary trained by another process since this one loaded them
+        _load_post_dictionaries()
+        return post_codec.decode(value, _post_dictionaries)
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.create_function('post_text', 1, _decode_post, deterministic=True)
+    return conn
+
+def _acquire():
+    # Reuse an idle connection to the current DB_PATH, opening one if none is free
+    while True:
+        try:
+            path, conn = _pool.get_nowait()
+        except queue.Empty:
+            return DB_PATH, _open_connection()
+        if path == DB_PATH:
+            return path, conn
+        conn.close()
+
+def _release(path, conn):
+    try:
+        _pool.put_nowait((path, conn))
+    except queue.Full:
+        conn.close()
+
+@contextmanager
+def _borrow():
+    """
+    Lend the calling thread a pooled connection. Nested calls on the same
+    thread share it, and only the outermost transaction commits or rolls back.
+    """
+    borrowed = getattr(_local, 'borrowed', None)
+    if borrowed is not None:
+        _local.depth += 1
+        try:
+            yield borrowed[1].cursor()
+        finally:
+            _local.depth -= 1
+        return
+    
+    path, conn = _acquire()
+    _local.borrowed = (path, conn)
+    _local.depth = 0
+    try:
+        yield conn.cursor()
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _local.borrowed = None
+        _release(path, conn)
+
+def connection():
+    """
+    Cursor on a pooled connection for reads
+    """
+    return _borrow()
+
+def transaction():
+    """
+    Cursor on a pooled connection that commits on exit and rolls back on error.
+    Wrap several save_* calls in one transaction() to batch them into a single commit.
+    """
+    return _borrow()
+
+def close_connections():
+    # Close idle pooled connections, e.g. before replacing the database file
+    while True:
+        try:
+            _, conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+# FTS5 indexes kept in sync with their content tables by triggers:
+# index -> (content table, indexed columns, tokenizer)
+SEARCH_INDEXES = {
+    # Case-insensitive substring search on the Following page
+    'accounts_search': ('accounts', ('handle', 'display_name', 'description'), 'trigram'),
+    'subreddits_search': ('subreddits', ('name', 'description'), 'trigram'),
+    # BM25-ranked keyword search over what accounts write about
+    'posts_text': ('posts', ('text',), 'porter unicode61'),
+    'accounts_text': ('accounts', ('display_name', 'description'), 'porter unicode61'),
+}
+# Content tables whose indexed columns are stored compressed, with the SQL function that decodes
+# them. FTS5 cannot read those columns itself, so their indexes are contentless.
+ENCODED_CONTENT = {'posts': 'post_text'}
+MIN_TRIGRAM_SEARCH = 3  # Shorter searches fall back to a prefix match
+TEXT_SEARCH_DEPTH = 1000  # Best-ranked matches per index considered by search_accounts_text
+COMMON_TERM_MATCHES = 5000  # Post matches beyond which a search term is too common to rank on
+
+def _create_search_index(c, index, table, columns, tokenize):
+    decoder = ENCODED_CONTENT.get(table)
+    content = '' if decoder else table
+    row = c.execute("SELECT sql FROM sqlite_master WHERE name=?", (index,)).fetchone()
+    if row and f"content='{content}'" not in row[0]:
+        # Built before its content table was encoded (or the other way round): index it again
+        for trigger in ('insert', 'delete', 'update'):
+            c.execute(f'DROP TRIGGER IF EXISTS {index}_{trigger}')
+        c.execute(f'DROP TABLE {index}')
+        row = None
+
+    def values(prefix):
+        return ", ".join(f"{decoder}({prefix}.{column})" if decoder else f"{prefix}.{column}" for column in columns)
+
+    column_list = ", ".join(columns)
+    # Rewriting a column in another encoding leaves its text, and so the index, unchanged
+    when = "WHEN " + " OR ".join(f"{decoder}(old.{column}) IS NOT {decoder}(new.{column})" for column in columns) \
+        if decoder else ""
+    c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5
+                  ({column_list}, content='{content}', tokenize='{tokenize}')''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN
+                      INSERT INTO {index} (rowid, {column_list}) VALUES (new.rowid, {values('new')});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN
+                      INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', old.rowid, {values('old')});
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {column_list} ON {table}
+                  {when} BEGIN
+                      INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', old.rowid, {values('old')});
+                      INSERT INTO {index} (rowid, {column_list}) VALUES (new.rowid, {values('new')});
+                  END''')
+    if not row:
+        # Index rows stored before the index existed
+        if decoder:
+            c.execute(f'INSERT INTO {index} (rowid, {column_list}) SELECT rowid, {values(table)} FROM {table}')
+        else:
+            c.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+def _search_condition(table, alias, search):
+    """
+    SQL condition and parameters matching rows of table (aliased as alias)
+    that contain search, case-insensitively. Searches of three characters or
+    more use the trigram index; shorter ones match a prefix of any column.
+    """
+    if len(search) >= MIN_TRIGRAM_SEARCH:
+        phrase = '"' + search.replace('"', '""') + '"'
+        return f'{alias}.rowid IN (SELECT rowid FROM {table}_search WHERE {table}_search MATCH ?)', [phrase]
+    pattern = f"{search.lower()}%"
+    columns = SEARCH_INDEXES[f'{table}_search'][1]
+    return "(" + " OR ".join(f"lower({alias}.{column}) LIKE ?" for column in columns) + ")", [pattern] * len(columns)
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Users table for login/registration
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (username TEXT PRIMARY KEY, password TEXT)''')
-    
-    # Bluesky credentials table
-    c.execute('''CREATE TABLE IF NOT EXISTS bluesky_credentials
-                 (username TEXT PRIMARY KEY,
-                  bluesky_username TEXT,
-                  bluesky_password TEXT)''')
-    
-    # Reddit credentials table
-    c.execute('''CREATE TABLE IF NOT EXISTS reddit_credentials
-                 (username TEXT PRIMARY KEY,
-                  reddit_username TEXT,
-                  reddit_password TEXT)''')
-    
-    # Following data table
-    c.execute('''CREATE TABLE IF NOT EXISTS following_data
-                 (username TEXT,
-                  following_data TEXT,
-                  PRIMARY KEY (username))''')
-    
-    # Reddit subscriptions table
-    c.execute('''CREATE TABLE IF NOT EXISTS reddit_subscriptions
-                 (username TEXT,
-                  subscriptions_data TEXT,
-                  PRIMARY KEY (username))''')
-    
-    # Potential connections table
-    c.execute('''CREATE TABLE IF NOT EXISTS potential_connections
-                 (username TEXT,
-                  connections_data TEXT,
-                  PRIMARY KEY (username))''')
-    
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        # Users table for login/registration
+        c.execute('''CREATE TABLE IF NOT EXISTS users
+                     (username TEXT PRIMARY KEY, password TEXT)''')
+    
+        # Bluesky credentials table
+        c.execute('''CREATE TABLE IF NOT EXISTS bluesky_credentials
+                     (username TEXT PRIMARY KEY,
+                      bluesky_username TEXT,
+                      bluesky_password TEXT)''')
+    
+        # Reddit credentials table
+        c.execute('''CREATE TABLE IF NOT EXISTS reddit_credentials
+                     (username TEXT PRIMARY KEY,
+                      reddit_username TEXT,
+                      reddit_password TEXT)''')
+    
+        # Bluesky accounts seen anywhere (followed accounts, candidates, followers)
+        c.execute('''CREATE TABLE IF NOT EXISTS accounts
+                     (did TEXT PRIMARY KEY,
+                      handle TEXT,
+                      display_name TEXT,
+                      description TEXT)''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_accounts_handle ON accounts (handle)')
+    
+        # Accounts each app user follows on Bluesky, in fetch order
+        c.execute('''CREATE TABLE IF NOT EXISTS follows
+                     (username TEXT,
+                      did TEXT,
+                      position INTEGER,
+                      PRIMARY KEY (username, did))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_follows_position ON follows (username, position)')
+    
+        # Second-degree accounts discovered for each app user, in discovery order
+        c.execute('''CREATE TABLE IF NOT EXISTS candidates
+                     (username TEXT,
+                      did TEXT,
+                      position INTEGER,
+                      PRIMARY KEY (username, did))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_candidates_position ON candidates (username, position)')
+    
+        # Authors of stored posts, numbered so post rows reference a small integer instead of a did
+        c.execute('''CREATE TABLE IF NOT EXISTS post_authors
+                     (id INTEGER PRIMARY KEY,
+                      did TEXT UNIQUE)''')
+    
+        # Crawled posts, stored once per author and post. rkey is the record key of the post's at://
+        # URI (the whole URI for reposts, NULL for posts saved before URIs were recorded); text holds
+        # post_codec output, zlib-compressed bytes or the plain text when that is shorter.
+        legacy_posts = 'did' in {row[1] for row in c.execute('PRAGMA table_info(posts)')}
+        if legacy_posts:
+            c.execute('ALTER TABLE posts RENAME TO legacy_posts')
+        c.execute('''CREATE TABLE IF NOT EXISTS posts
+                     (id INTEGER PRIMARY KEY,
+                      author INTEGER,
+                      position INTEGER,
+                      text BLOB,
+                      rkey TEXT)''')
+        # Also serves lookups by author; their few posts are sorted by position on the fly
+        c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_rkey ON posts (author, rkey)')
+        if legacy_posts:
+            _migrate_legacy_posts(c)
+    
+        # Shared zlib dictionaries trained on stored posts, by Adler-32 id; each compressed post records its
+        # dictionary's id, and new posts use the newest one
+        c.execute('''CREATE TABLE IF NOT EXISTS post_dictionaries
+                     (id INTEGER PRIMARY KEY,
+                      dictionary BLOB,
+                      created_at REAL)''')
+    
+        # Subreddit metadata, shared by every subscriber
+        c.execute('''CREATE TABLE IF NOT EXISTS subreddits
+                     (name TEXT PRIMARY KEY,
+                      url TEXT,
+                      subscribers INTEGER,
+                      description TEXT)''')
+    
+        # Subreddits each app user is subscribed to
+        c.execute('''CREATE TABLE IF NOT EXISTS user_subreddits
+                     (username TEXT,
+                      name TEXT,
+                      position INTEGER,
+                      PRIMARY KEY (username, name))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_user_subreddits_position ON user_subreddits (username, position)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_user_subreddits_name ON user_subreddits (name)')
+    
+        # Each app user's newest Reddit submissions and comments
+        c.execute('''CREATE TABLE IF NOT EXISTS reddit_activity
+                     (username TEXT,
+                      fullname TEXT,
+                      kind TEXT,
+                      subreddit TEXT,
+                      text TEXT,
+                      score INTEGER,
+                      created_utc REAL,
+                      PRIMARY KEY (username, fullname))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_reddit_activity_subreddit ON reddit_activity (subreddit)')
+    
+        # Newest followers of crawled accounts, used to reuse second-degree results
+        c.execute('''CREATE TABLE IF NOT EXISTS follower_edges
+                     (followee_did TEXT,
+                      follower_did TEXT,
+                      position INTEGER,
+                      PRIMARY KEY (followee_did, follower_did))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_follower_edges_follower ON follower_edges (follower_did)')
+    
+        # Profile counters from the last sync, compared to skip unchanged accounts
+        c.execute('''CREATE TABLE IF NOT EXISTS account_sync
+                     (did TEXT PRIMARY KEY,
+                      posts_count INTEGER,
+                      followers_count INTEGER,
+                      follows_count INTEGER,
+                      synced_at REAL)''')
+    
+        # Exported atproto sessions, keyed by a hash of the Bluesky login and password
+        c.execute('''CREATE TABLE IF NOT EXISTS bluesky_sessions
+                     (key TEXT PRIMARY KEY,
+                      session_string TEXT,
+                      updated_at REAL)''')
+    
+        # Background jobs (Bluesky/Reddit fetches, recommendation generation)
+        c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                     (id INTEGER PRIMARY KEY,
+                      username TEXT,
+                      kind TEXT,
+                      status TEXT,
+                      progress REAL DEFAULT 0,
+                      message TEXT,
+                      result TEXT,
+                      error TEXT,
+                      created_at REAL,
+                      updated_at REAL)''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_kind ON jobs (username, kind, id)')
+    
+        # Gemini responses keyed by a hash of model, temperature and prompt
+        c.execute('''CREATE TABLE IF NOT EXISTS llm_cache
+                     (key TEXT PRIMARY KEY,
+                      model TEXT,
+                      response TEXT,
+                      created_at REAL,
+                      last_used_at REAL,
+                      hits INTEGER DEFAULT 0)''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)')
+    
+        # Full-text indexes over accounts, subreddits and posts
+        for index, (table, columns, tokenize) in SEARCH_INDEXES.items():
+            _create_search_index(c, index, table, columns, tokenize)
+    
+        # Recommendation job results, precomputed by batch_recommendations.py or saved by live jobs
+        c.execute('''CREATE TABLE IF NOT EXISTS recommendations
+                     (username TEXT,
+                      platform TEXT,
+                      version INTEGER,
+                      result TEXT,
+                      computed_at REAL,
+                      PRIMARY KEY (username, platform))''')
+    
+        # Write counters of tables that derived in-memory structures are built from (the follow graph,
+        # the community index), bumped in the writing transaction so every process sees a change
+        c.execute('''CREATE TABLE IF NOT EXISTS data_versions
+                     (name TEXT PRIMARY KEY,
+                      version INTEGER)''')
+    
+        # Per-user interest vectors (float32 bytes) and their IVF list in the similar-user index
+        c.execute('''CREATE TABLE IF NOT EXISTS interest_vectors
+                     (username TEXT PRIMARY KEY,
+                      vector BLOB,
+                      list_id INTEGER,
+                      updated_at REAL)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS interest_centroids
+                     (list_id INTEGER PRIMARY KEY,
+                      vector BLOB)''')
+    
+        # Structured interests per user and platform: weighted topics (JSON) and their topic vector (float32 bytes)
+        c.execute('''CREATE TABLE IF NOT EXISTS interest_profiles
+                     (username TEXT,
+                      platform TEXT,
+                      topics TEXT,
+                      vector BLOB,
+                      updated_at REAL,
+                      PRIMARY KEY (username, platform))''')
+        if 'vector' not in {row[1] for row in c.execute('PRAGMA table_info(interest_profiles)')}:
+            # Databases created while profiles stored topics only; their vectors are computed when read
+            c.execute('ALTER TABLE interest_profiles ADD COLUMN vector BLOB')
+    
+        # In-progress crawl state (cursor, parameters) and the results fetched so far, so an
+        # interrupted Bluesky fetch resumes from its last checkpoint instead of starting over
+        c.execute('''CREATE TABLE IF NOT EXISTS crawl_checkpoints
+                     (username TEXT,
+                      kind TEXT,
+                      state TEXT,
+                      updated_at REAL,
+                      PRIMARY KEY (username, kind))''')
+        c.execute('''CREATE TABLE IF NOT EXISTS crawl_results
+                     (username TEXT,
+                      kind TEXT,
+                      did TEXT,
+                      result TEXT,
+                      PRIMARY KEY (username, kind, did))''')
+    
+        _migrate_json_tables(c)
+
+FOLLOW_GRAPH_DATA = 'follow_graph'  # follows and follower_edges
+SUBREDDIT_MEMBERSHIP_DATA = 'subreddit_memberships'  # user_subreddits, reddit_activity and subreddits
+INTEREST_INDEX_DATA = 'interest_index'  # interest_vectors and interest_centroids
+
+def _bump_data_version(c, name):
+    c.execute('''INSERT INTO data_versions VALUES (?, 1)
+                 ON CONFLICT(name) DO UPDATE SET version=version + 1
+                 RETURNING version''', (name,))
+    return c.fetchone()[0]
+
+def get_data_version(name):
+    """
+    Number of committed writes to the tables behind name, for telling whether
+    a structure built from them is stale
+    """
+    with connection() as c:
+        c.execute('SELECT version FROM data_versions WHERE name=?', (name,))
+        row = c.fetchone()
+    return row[0] if row else 0
+
+class VersionedCache:
+    """
+    A value built from the tables behind a data_versions name, kept for the
+    life of the process. get() rebuilds it with build() once any process has
+    written to those tables since it was built.
+    """
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+        self.lock = threading.RLock()
+        self._value = None
+        self._version = None
+
+    def get(self):
+        with self.lock:
+            # Read the version first: a write landing during the build just triggers another rebuild
+            version = get_data_version(self.name)
+            if self._value is None or version != self._version:
+                self._value = self.build()
+                self._version = version
+            return self._value
+
+    def written(self, version):
+        """
+        Record a write, already applied to the cached value by the caller, that
+        brought the data to version. Unless another process wrote in between,
+        the value stays current and the next get() skips the rebuild.
+        """
+        with self.lock:
+            if self._version is not None and self._version == version - 1:
+                self._version = version
 
 # Add functions to save and retrieve Reddit credentials
 def save_reddit_credentials(username, reddit_username, reddit_password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT OR REPLACE INTO reddit_credentials VALUES (?, ?, ?)', 
-              (username, reddit_username, reddit_password))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO reddit_credentials VALUES (?, ?, ?)', 
+                  (username, reddit_username, reddit_password))
 
 def get_reddit_credentials(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM reddit_credentials WHERE username=?', (username,))
-    result = c.fetchone()
-    conn.close()
+    with connection() as c:
+        c.execute('SELECT * FROM reddit_credentials WHERE username=?', (username,))
+        result = c.fetchone()
     
     if result:
         return {
@@ -69,55 +474,122 @@ def get_reddit_credentials(username):
     return None
 
 # Add functions to save and retrieve Reddit subscriptions
+def _upsert_subreddits(c, subreddits):
+    c.executemany('''INSERT INTO subreddits (name, url, subscribers, description) VALUES (?, ?, ?, ?)
+                     ON CONFLICT(name) DO UPDATE SET url=excluded.url,
+                     subscribers=excluded.subscribers, description=excluded.description''',
+                  [(sub.get('name'), sub.get('url'), sub.get('subscribers'), sub.get('description'))
+                   for sub in subreddits])
+
+def _save_reddit_subscriptions(c, username, subscriptions):
+    _upsert_subreddits(c, subscriptions)
+    c.execute('DELETE FROM user_subreddits WHERE username=?', (username,))
+    c.executemany('INSERT OR REPLACE INTO user_subreddits VALUES (?, ?, ?)',
+                  [(username, sub.get('name'), position) for position, sub in enumerate(subscriptions)])
+    _bump_data_version(c, SUBREDDIT_MEMBERSHIP_DATA)
+
 def save_reddit_subscriptions(username, subscriptions):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT OR REPLACE INTO reddit_subscriptions VALUES (?, ?)', 
-              (username, json.dumps(subscriptions)))
-    conn.commit()
-    conn.close()
-
-def get_reddit_subscriptions(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT subscriptions_data FROM reddit_subscriptions WHERE username=?', (username,))
-    result = c.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        # Convert JSON string back to list
-        return json.loads(result[0])
-    return []
+    with transaction() as c:
+        _save_reddit_subscriptions(c, username, subscriptions)
+
+def get_reddit_subscriptions(username, limit=None, offset=0, search=None):
+    """
+    Subscribed subreddits in fetch order, optionally only those whose name or
+    description contains search (case-insensitive)
+    """
+    condition, params = _search_condition('subreddits', 's', search) if search else ('1', [])
+    with connection() as c:
+        c.execute(f'''SELECT s.name, s.url, s.subscribers, s.description
+                      FROM user_subreddits us JOIN subreddits s ON s.name = us.name
+                      WHERE us.username=? AND {condition} ORDER BY us.position LIMIT ? OFFSET ?''',
+                  [username] + params + [-1 if limit is None else limit, offset])
+        result = c.fetchall()
+    
+    return [
+        {
+            'name': row[0],
+            'url': row[1],
+            'subscribers': row[2],
+            'description': row[3]
+        } for row in result
+    ]
+
+def count_reddit_subscriptions(username, search=None):
+    condition, params = _search_condition('subreddits', 's', search) if search else ('1', [])
+    with connection() as c:
+        c.execute(f'''SELECT COUNT(*) FROM user_subreddits us JOIN subreddits s ON s.name = us.name
+                      WHERE us.username=? AND {condition}''', [username] + params)
+        return c.fetchone()[0]
+
+def get_subreddit_memberships():
+    """
+    Every stored subscription, and every subreddit a user has posted or
+    commented in, as distinct (username, subreddit_name) pairs
+    """
+    with connection() as c:
+        c.execute('''SELECT username, name FROM user_subreddits
+                     UNION
+                     SELECT username, subreddit FROM reddit_activity''')
+        return c.fetchall()
+
+def save_subreddits(subreddits):
+    # Store or refresh subreddit metadata without touching anyone's subscriptions
+    with transaction() as c:
+        _upsert_subreddits(c, subreddits)
+        _bump_data_version(c, SUBREDDIT_MEMBERSHIP_DATA)
+
+def get_missing_subreddits(names):
+    """
+    The names among names that have no stored metadata
+    """
+    names = list(dict.fromkeys(names))
+    known = set()
+    with connection() as c:
+        for batch in _batches(names):
+            c.execute(f'SELECT name FROM subreddits WHERE name IN ({",".join("?" * len(batch))})', batch)
+            known.update(row[0] for row in c.fetchall())
+    return [name for name in names if name not in known]
+
+def save_reddit_activity(username, activity):
+    """
+    Replace a user's stored submissions and comments. activity is a list of
+    dicts with fullname, kind, subreddit, text, score and created_utc.
+    """
+    with transaction() as c:
+        c.execute('DELETE FROM reddit_activity WHERE username=?', (username,))
+        c.executemany('INSERT OR REPLACE INTO reddit_activity VALUES (?, ?, ?, ?, ?, ?, ?)',
+                      [(username, item['fullname'], item['kind'], item['subreddit'], item['text'],
+                        item.get('score'), item.get('created_utc')) for item in activity])
+        _bump_data_version(c, SUBREDDIT_MEMBERSHIP_DATA)
+
+def get_reddit_activity(username, limit=None):
+    # Newest first
+    with connection() as c:
+        c.execute('''SELECT fullname, kind, subreddit, text, score, created_utc FROM reddit_activity
+                     WHERE username=? ORDER BY created_utc DESC LIMIT ?''',
+                  (username, -1 if limit is None else limit))
+        return [{'fullname': row[0], 'kind': row[1], 'subreddit': row[2], 'text': row[3],
+                 'score': row[4], 'created_utc': row[5]} for row in c.fetchall()]
 
 def verify_user(username, password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username=? AND password=?', (username, password))
-    result = c.fetchone()
-    conn.close()
+    with connection() as c:
+        c.execute('SELECT * FROM users WHERE username=? AND password=?', (username, password))
+        result = c.fetchone()
     return bool(result)
 
 def save_user(username, password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT OR REPLACE INTO users VALUES (?, ?)', (username, password))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO users VALUES (?, ?)', (username, password))
 
 def save_bluesky_credentials(username, bluesky_username, bluesky_password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('INSERT OR REPLACE INTO bluesky_credentials VALUES (?, ?, ?)', 
-              (username, bluesky_username, bluesky_password))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO bluesky_credentials VALUES (?, ?, ?)', 
+                  (username, bluesky_username, bluesky_password))
 
 def get_bluesky_credentials(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT bluesky_username, bluesky_password FROM bluesky_credentials WHERE username=?', (username,))
-    result = c.fetchone()
-    conn.close()
+    with connection() as c:
+        c.execute('SELECT bluesky_username, bluesky_password FROM bluesky_credentials WHERE username=?', (username,))
+        result = c.fetchone()
     
     if result:
         return {
@@ -126,46 +598,593 @@ def get_bluesky_credentials(username):
         }
     return None
 
-def save_following_data(username, following_data):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Convert list to JSON string for storage
-    following_json = json.dumps(following_data)
-    c.execute('INSERT OR REPLACE INTO following_data VALUES (?, ?)', 
-              (username, following_json))
-    conn.commit()
-    conn.close()
-
-def get_following_data(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT following_data FROM following_data WHERE username=?', (username,))
-    result = c.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        # Convert JSON string back to list
-        return json.loads(result[0])
-    return []
+def _upsert_accounts(c, accounts):
+    # accounts is a list of (did, handle, display_name, description); a missing description keeps the stored one
+    c.executemany('''INSERT INTO accounts (did, handle, display_name, description) VALUES (?, ?, ?, ?)
+                     ON CONFLICT(did) DO UPDATE SET handle=excluded.handle,
+                     display_name=excluded.display_name,
+                     description=COALESCE(excluded.description, accounts.description)''', accounts)
+
+def _save_following_data(c, username, following_data, start=0):
+    if start == 0:
+        c.execute('DELETE FROM follows WHERE username=?', (username,))
+    _upsert_accounts(c, [(f.get('did'), f.get('handle'), f.get('display_name'), f.get('description'))
+                         for f in following_data])
+    c.executemany('INSERT OR REPLACE INTO follows VALUES (?, ?, ?)',
+                  [(username, f.get('did'), start + position) for position, f in enumerate(following_data)])
+    _bump_data_version(c, FOLLOW_GRAPH_DATA)
+
+def save_following_data(username, following_data, start=0):
+    """
+    Store followed accounts. start=0 replaces the user's list; a non-zero start
+    appends another page after the rows already saved.
+    """
+    with transaction() as c:
+        _save_following_data(c, username, following_data, start)
+
+def get_following_data(username, limit=None, offset=0):
+    with connection() as c:
+        c.execute('''SELECT a.did, a.handle, a.display_name
+                     FROM follows f JOIN accounts a ON a.did = f.did
+                     WHERE f.username=? ORDER BY f.position LIMIT ? OFFSET ?''',
+                  (username, -1 if limit is None else limit, offset))
+        result = c.fetchall()
+    
+    return [{'did': row[0], 'handle': row[1], 'display_name': row[2]} for row in result]
+
+def search_following_data(username, search, limit=None, offset=0):
+    """
+    Followed accounts whose handle, display name or description contains search (case-insensitive)
+    """
+    condition, params = _search_condition('accounts', 'a', search)
+    with connection() as c:
+        c.execute(f'''SELECT a.did, a.handle, a.display_name
+                      FROM follows f JOIN accounts a ON a.did = f.did
+                      WHERE f.username=? AND {condition}
+                      ORDER BY f.position LIMIT ? OFFSET ?''',
+                  [username] + params + [-1 if limit is None else limit, offset])
+        result = c.fetchall()
+    
+    return [{'did': row[0], 'handle': row[1], 'display_name': row[2]} for row in result]
+
+def count_following_data(username, search=None):
+    condition, params = _search_condition('accounts', 'a', search) if search else ('1', [])
+    with connection() as c:
+        c.execute(f'''SELECT COUNT(*) FROM follows f JOIN accounts a ON a.did = f.did
+                      WHERE f.username=? AND {condition}''', [username] + params)
+        return c.fetchone()[0]
+
+def _save_potential_connections(c, username, connections_data):
+    c.execute('DELETE FROM candidates WHERE username=?', (username,))
+    _upsert_accounts(c, [(conn.get('did'), conn.get('handle'), conn.get('name'), conn.get('description'))
+                         for conn in connections_data])
+    c.executemany('INSERT OR REPLACE INTO candidates VALUES (?, ?, ?)',
+                  [(username, conn.get('did'), position) for position, conn in enumerate(connections_data)])
+    
+    _save_posts(c, connections_data)
+
+def _current_post_dictionary(c):
+    # The newest dictionary trained, which new posts are compressed with, or b'' before any is
+    row = c.execute('SELECT id FROM post_dictionaries ORDER BY created_at DESC LIMIT 1').fetchone()
+    if row is None:
+        return b''
+    if row[0] not in _post_dictionaries:
+        dictionary = c.execute('SELECT dictionary FROM post_dictionaries WHERE id=?', row).fetchone()[0]
+        with _dictionary_lock:
+            _post_dictionaries[row[0]] = dictionary
+    return _post_dictionaries[row[0]]
+
+def _post_key(did, uri):
+    # Posts are stored under their author by record key; reposts of other accounts' posts keep their full URI
+    prefix = POST_URI_FORMAT.format(did=did, rkey='')
+    return uri[len(prefix):] if uri and uri.startswith(prefix) else uri
+
+def _post_uri(did, rkey):
+    return rkey if rkey is None or rkey.startswith('at://') else POST_URI_FORMAT.format(did=did, rkey=rkey)
+
+def _post_author_ids(c, dids):
+    # {did: post_authors id}, numbering dids seen for the first time
+    c.executemany('INSERT INTO post_authors (did) VALUES (?) ON CONFLICT(did) DO NOTHING', [(did,) for did in dids])
+    authors = {}
+    for batch in _batches(dids):
+        c.execute(f'SELECT did, id FROM post_authors WHERE did IN ({",".join("?" * len(batch))})', batch)
+        authors.update(c.fetchall())
+    return authors
+
+def _save_posts(c, connections_data):
+    """
+    Store each candidate's posts under its author. Posts with a URI are kept
+    once per author and URI, so a re-crawl only compresses and writes the
+    posts not stored yet and drops the author's posts that are gone; posts
+    without one (older crawls) replace everything stored for their author.
+    """
+    dictionary = _current_post_dictionary(c)
+    if not dictionary:
+        incoming = [text for conn in connections_data for text in conn.get('posts', [])]
+        if len(incoming) + c.execute('SELECT COUNT(*) FROM posts').fetchone()[0] >= DICTIONARY_MIN_POSTS:
+            dictionary = _train_post_dictionary(c, incoming=incoming)
+    
+    authors = _post_author_ids(c, [conn.get('did') for conn in connections_data])
+    moved = []
+    added = []
+    for conn in connections_data:
+        did = conn.get('did')
+        author = authors[did]
+        texts = conn.get('posts', [])
+        rkeys = [_post_key(did, uri) for uri in conn.get('post_uris') or [None] * len(texts)]
+        kept = [rkey for rkey in rkeys if rkey]
+        c.execute(f'DELETE FROM posts WHERE author=? AND (rkey IS NULL OR rkey NOT IN ({",".join("?" * len(kept))}))',
+                  [author] + kept)
+        stored = {row[0] for row in c.execute('SELECT rkey FROM posts WHERE author=?', (author,))} if kept else set()
+        for position, (text, rkey) in enumerate(zip(texts, rkeys)):
+            if rkey in stored:
+                moved.append((position, author, rkey))
+            else:
+                added.append((author, position, post_codec.encode(text, dictionary), rkey))
+    c.executemany('UPDATE posts SET position=? WHERE author=? AND rkey=?', moved)
+    c.executemany('''INSERT INTO posts (author, position, text, rkey) VALUES (?, ?, ?, ?)
+                     ON CONFLICT(author, rkey) DO UPDATE SET position=excluded.position''', added)
+
+def _train_post_dictionary(c, sample_size=None, incoming=()):
+    # Train a dictionary on a random sample of stored and incoming posts and make it the one new posts use
+    sample_size = sample_size or DICTIONARY_SAMPLE
+    c.execute('SELECT post_text(text) FROM posts ORDER BY random() LIMIT ?', (sample_size,))
+    texts = [row[0] for row in c.fetchall() if row[0]] + list(incoming[:sample_size])
+    dictionary = post_codec.train_dictionary(texts)
+    if not dictionary:
+        return b''
+    key = post_codec.dictionary_key(dictionary)
+    # Cached before the transaction commits: the posts compressed with it are decoded by the index triggers
+    with _dictionary_lock:
+        _post_dictionaries[key] = dictionary
+    c.execute('''INSERT INTO post_dictionaries (id, dictionary, created_at) VALUES (?, ?, ?)
+                 ON CONFLICT(id) DO UPDATE SET created_at=excluded.created_at''', (key, dictionary, time.time()))
+    return dictionary
 
 def save_potential_connections(username, connections_data):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Convert list to JSON string for storage
-    connections_json = json.dumps(connections_data)
-    c.execute('INSERT OR REPLACE INTO potential_connections VALUES (?, ?)', 
-              (username, connections_json))
-    conn.commit()
-    conn.close()
-
-def get_potential_connections(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT connections_data FROM potential_connections WHERE username=?', (username,))
-    result = c.fetchone()
-    conn.close()
-    
-    if result and result[0]:
-        # Convert JSON string back to list
-        return json.loads(result[0])
-    return []
\ No newline at end of file
+    with transaction() as c:
+        _save_potential_connections(c, username, connections_data)
+
+def get_potential_connections(username, limit=None, posts_limit=None):
+    """
+    Candidates in discovery order with up to posts_limit posts each (all posts if None),
+    their URIs in post_uris (None for posts stored without one)
+    """
+    with connection() as c:
+        c.execute('''SELECT a.did, a.handle, a.display_name
+                     FROM candidates cd JOIN accounts a ON a.did = cd.did
+                     WHERE cd.username=? ORDER BY cd.position LIMIT ?''',
+                  (username, -1 if limit is None else limit))
+        connections = [{'did': row[0], 'handle': row[1], 'name': row[2], 'posts': [], 'post_uris': []}
+                       for row in c.fetchall()]
+    
+        by_did = {conn['did']: conn for conn in connections}
+        if by_did:
+            # Only the listed candidates' posts are read and decoded, not those of every candidate
+            c.execute('''WITH listed AS (SELECT cd.did FROM candidates cd JOIN accounts a ON a.did = cd.did
+                                         WHERE cd.username=? ORDER BY cd.position LIMIT ?)
+                         SELECT pa.did, p.rkey, post_text(p.text) FROM listed
+                         JOIN post_authors pa ON pa.did = listed.did
+                         JOIN posts p ON p.author = pa.id
+                         WHERE ? IS NULL OR p.position < ?
+                         ORDER BY pa.did, p.position''',
+                      (username, -1 if limit is None else limit, posts_limit, posts_limit))
+            for did, rkey, text in c.fetchall():
+                by_did[did]['posts'].append(text)
+                by_did[did]['post_uris'].append(_post_uri(did, rkey))
+    
+    return connections
+
+SQL_VARIABLE_BATCH = 500  # Keep IN (...) lists well under SQLite's variable limit
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def search_accounts_text(terms, limit=20, exclude_followed_by=None):
+    """
+    Crawled accounts whose posts or profile descriptions match any of terms,
+    best BM25 score first, as dicts with did, handle, name and score (higher
+    is better). Accounts exclude_followed_by already follows are left out.
+
+    Ranking has to score every matching post, so terms matching more than
+    COMMON_TERM_MATCHES posts are dropped like stopwords. If every term is
+    that common, only the newest TEXT_SEARCH_DEPTH matches are ranked.
+    """
+    if not terms:
+        return []
+    with connection() as c:
+        specific = [term for term in terms if c.execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM posts_text WHERE posts_text MATCH ? LIMIT ?)',
+            (_fts_phrase(term), COMMON_TERM_MATCHES)).fetchone()[0] < COMMON_TERM_MATCHES]
+        query = " OR ".join(_fts_phrase(term) for term in (specific or terms))
+        post_order = "rank" if specific else "posts_text.rowid DESC"
+        # bm25() is lower-is-better; each account sums the scores of its matching posts and description
+        c.execute(f'''SELECT a.did, a.handle, a.display_name, -SUM(hits.score) AS score
+                      FROM (SELECT * FROM (SELECT pa.did AS did, bm25(posts_text) AS score
+                                           FROM posts_text JOIN posts p ON p.id = posts_text.rowid
+                                           JOIN post_authors pa ON pa.id = p.author
+                                           WHERE posts_text MATCH ? ORDER BY {post_order} LIMIT ?)
+                            UNION ALL
+                            SELECT * FROM (SELECT a.did AS did, bm25(accounts_text) AS score
+                                           FROM accounts_text JOIN accounts a ON a.rowid = accounts_text.rowid
+                                           WHERE accounts_text MATCH ? ORDER BY rank LIMIT ?)) hits
+                      JOIN accounts a ON a.did = hits.did
+                      WHERE a.did NOT IN (SELECT did FROM follows WHERE username=?)
+                      GROUP BY a.did ORDER BY score DESC LIMIT ?''',
+                  (query, TEXT_SEARCH_DEPTH, query, TEXT_SEARCH_DEPTH, exclude_followed_by, limit))
+        return [{'did': row[0], 'handle': row[1], 'name': row[2], 'score': row[3]} for row in c.fetchall()]
+
+def get_account_posts(dids, posts_limit=None):
+    """
+    Stored post texts per author as {did: [text, ...]}, up to posts_limit each
+    """
+    posts = {}
+    with connection() as c:
+        for batch in _batches(dids):
+            c.execute(f'''SELECT pa.did, post_text(p.text) FROM post_authors pa JOIN posts p ON p.author = pa.id
+                          WHERE pa.did IN ({",".join("?" * len(batch))}) AND (? IS NULL OR p.position < ?)
+                          ORDER BY pa.did, p.position''', batch + [posts_limit, posts_limit])
+            for did, text in c.fetchall():
+                posts.setdefault(did, []).append(text)
+    return posts
+
+def iter_posts(batch_size=SQL_VARIABLE_BATCH * 10):
+    """
+    Every stored post as (uri, did, position, text) tuples, in batches of
+    batch_size lists in storage order
+    """
+    last_id = 0
+    while True:
+        with connection() as c:
+            c.execute('''SELECT p.id, p.rkey, pa.did, p.position, post_text(p.text)
+                         FROM posts p JOIN post_authors pa ON pa.id = p.author
+                         WHERE p.id > ? ORDER BY p.id LIMIT ?''', (last_id, batch_size))
+            rows = c.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [(_post_uri(did, rkey), did, position, text) for _, rkey, did, position, text in rows]
+
+def train_post_dictionary(sample_size=None):
+    """
+    Train a new compression dictionary on stored posts for new posts to use.
+    Returns its id, or None if the posts share too little to train one.
+    """
+    with transaction() as c:
+        dictionary = _train_post_dictionary(c, sample_size)
+    return post_codec.dictionary_key(dictionary) or None
+
+def recompress_posts(batch_size=SQL_VARIABLE_BATCH * 10):
+    """
+    Re-encode stored posts not yet compressed with the newest dictionary.
+    Returns how many were rewritten; VACUUM to give the space back.
+    """
+    rewritten = 0
+    last_id = 0
+    while True:
+        with transaction() as c:
+            dictionary = _current_post_dictionary(c)
+            dictionary_id = post_codec.dictionary_key(dictionary)
+            c.execute('SELECT id, text FROM posts WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                return rewritten
+            last_id = rows[-1][0]
+            updates = []
+            for post_id, value in rows:
+                if post_codec.dictionary_id(value) != dictionary_id:
+                    encoded = post_codec.encode(_decode_post(value), dictionary)
+                    if encoded != value:
+                        updates.append((encoded, post_id))
+            c.executemany('UPDATE posts SET text=? WHERE id=?', updates)
+            rewritten += len(updates)
+
+def _batches(items):
+    items = list(items)
+    for start in range(0, len(items), SQL_VARIABLE_BATCH):
+        yield items[start:start + SQL_VARIABLE_BATCH]
+
+def save_follower_edges(followee_did, follower_dids):
+    # Replace the stored newest followers of one account
+    with transaction() as c:
+        c.execute('DELETE FROM follower_edges WHERE followee_did=?', (followee_did,))
+        c.executemany('INSERT OR REPLACE INTO follower_edges VALUES (?, ?, ?)',
+                      [(followee_did, did, position) for position, did in enumerate(follower_dids)])
+        _bump_data_version(c, FOLLOW_GRAPH_DATA)
+
+def get_follower_edges(followee_dids):
+    """
+    Stored followers per followee as {followee_did: [follower_did, ...]}
+    """
+    edges = {}
+    with connection() as c:
+        for batch in _batches(followee_dids):
+            c.execute(f'''SELECT followee_did, follower_did FROM follower_edges
+                          WHERE followee_did IN ({",".join("?" * len(batch))})
+                          ORDER BY followee_did, position''', batch)
+            for followee_did, follower_did in c.fetchall():
+                edges.setdefault(followee_did, []).append(follower_did)
+    return edges
+
+def get_follow_graph_edges(user_prefix):
+    """
+    Every stored follow as (follower, followee): each user's following list,
+    with the user as user_prefix + username, followed by the crawled follower edges
+    """
+    with connection() as c:
+        c.execute('''SELECT ? || username, did FROM follows
+                     UNION ALL
+                     SELECT follower_did, followee_did FROM follower_edges''', (user_prefix,))
+        return c.fetchall()
+
+def save_account_sync(profiles):
+    """
+    Record profile counters from a sync. profiles is a list of dicts with did,
+    posts_count, followers_count and follows_count.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.executemany('INSERT OR REPLACE INTO account_sync VALUES (?, ?, ?, ?, ?)',
+                      [(p['did'], p.get('posts_count'), p.get('followers_count'), p.get('follows_count'), now)
+                       for p in profiles])
+
+def get_account_sync(dids):
+    state = {}
+    with connection() as c:
+        for batch in _batches(dids):
+            c.execute(f'''SELECT did, posts_count, followers_count, follows_count, synced_at
+                          FROM account_sync WHERE did IN ({",".join("?" * len(batch))})''', batch)
+            for row in c.fetchall():
+                state[row[0]] = {
+                    'posts_count': row[1],
+                    'followers_count': row[2],
+                    'follows_count': row[3],
+                    'synced_at': row[4]
+                }
+    return state
+
+def save_crawl_checkpoint(username, kind, state):
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO crawl_checkpoints VALUES (?, ?, ?, ?)',
+                  (username, kind, json.dumps(state), time.time()))
+
+def get_crawl_checkpoint(username, kind):
+    """
+    Stored crawl state as {'state', 'updated_at'}, or None
+    """
+    with connection() as c:
+        c.execute('SELECT state, updated_at FROM crawl_checkpoints WHERE username=? AND kind=?', (username, kind))
+        row = c.fetchone()
+    if not row:
+        return None
+    return {'state': json.loads(row[0]), 'updated_at': row[1]}
+
+def save_crawl_results(username, kind, results):
+    # results is {did: JSON-serializable result} fetched since the last checkpoint
+    with transaction() as c:
+        c.executemany('INSERT OR REPLACE INTO crawl_results VALUES (?, ?, ?, ?)',
+                      [(username, kind, did, json.dumps(result)) for did, result in results.items()])
+
+def get_crawl_results(username, kind):
+    with connection() as c:
+        c.execute('SELECT did, result FROM crawl_results WHERE username=? AND kind=?', (username, kind))
+        return {did: json.loads(result) for did, result in c.fetchall()}
+
+def delete_crawl_checkpoint(username, kinds):
+    """
+    Drop the checkpoints and partial results of the given kinds, e.g. once a crawl completes
+    """
+    with transaction() as c:
+        for kind in kinds:
+            c.execute('DELETE FROM crawl_checkpoints WHERE username=? AND kind=?', (username, kind))
+            c.execute('DELETE FROM crawl_results WHERE username=? AND kind=?', (username, kind))
+
+def save_bluesky_session(key, session_string):
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO bluesky_sessions VALUES (?, ?, ?)', (key, session_string, time.time()))
+
+def get_bluesky_session(key):
+    with connection() as c:
+        c.execute('SELECT session_string FROM bluesky_sessions WHERE key=?', (key,))
+        result = c.fetchone()
+    return result[0] if result else None
+
+def delete_bluesky_session(key):
+    with transaction() as c:
+        c.execute('DELETE FROM bluesky_sessions WHERE key=?', (key,))
+
+JOB_COLUMNS = ('id', 'username', 'kind', 'status', 'progress', 'message', 'result', 'error', 'created_at', 'updated_at')
+
+def _job_from_row(row):
+    if not row:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def create_job(username, kind):
+    now = time.time()
+    with transaction() as c:
+        c.execute('''INSERT INTO jobs (username, kind, status, progress, created_at, updated_at)
+                     VALUES (?, ?, 'queued', 0, ?, ?)''', (username, kind, now, now))
+        return c.lastrowid
+
+def update_job(job_id, **fields):
+    """
+    Update status, progress, message, result (any JSON-serializable value) or error
+    """
+    if 'result' in fields:
+        fields['result'] = json.dumps(fields['result'])
+    fields['updated_at'] = time.time()
+    assignments = ", ".join(f"{column}=?" for column in fields if column in JOB_COLUMNS)
+    with transaction() as c:
+        c.execute(f'UPDATE jobs SET {assignments} WHERE id=?',
+                  [value for column, value in fields.items() if column in JOB_COLUMNS] + [job_id])
+
+def get_job(job_id):
+    with connection() as c:
+        c.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id=?', (job_id,))
+        return _job_from_row(c.fetchone())
+
+def get_latest_job(username, kind):
+    with connection() as c:
+        c.execute(f'''SELECT {", ".join(JOB_COLUMNS)} FROM jobs
+                      WHERE username=? AND kind=? ORDER BY id DESC LIMIT 1''', (username, kind))
+        return _job_from_row(c.fetchone())
+
+def fail_interrupted_jobs():
+    # Jobs left queued/running by a previous server process will never finish
+    with transaction() as c:
+        c.execute('''UPDATE jobs SET status='failed', error='Interrupted by a server restart', updated_at=?
+                     WHERE status IN ('queued', 'running')''', (time.time(),))
+
+def get_cached_response(key, ttl):
+    """
+    Cached LLM response for key, or None if missing or older than ttl seconds
+    """
+    now = time.time()
+    with transaction() as c:
+        c.execute('SELECT response, created_at FROM llm_cache WHERE key=?', (key,))
+        result = c.fetchone()
+        if not result:
+            return None
+        if now - result[1] > ttl:
+            c.execute('DELETE FROM llm_cache WHERE key=?', (key,))
+            return None
+        c.execute('UPDATE llm_cache SET last_used_at=?, hits=hits+1 WHERE key=?', (now, key))
+    return result[0]
+
+def save_cached_response(key, model, response, max_entries):
+    # Insert, then evict least recently used entries beyond max_entries
+    now = time.time()
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, 0)',
+                  (key, model, response, now, now))
+        c.execute('''DELETE FROM llm_cache WHERE key IN
+                     (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)''',
+                  (max_entries,))
+
+def clear_cached_responses():
+    with transaction() as c:
+        c.execute('DELETE FROM llm_cache')
+
+def get_usernames():
+    with connection() as c:
+        c.execute('SELECT username FROM users ORDER BY username')
+        return [row[0] for row in c.fetchall()]
+
+def save_recommendations(username, platform, version, result):
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO recommendations VALUES (?, ?, ?, ?, ?)',
+                  (username, platform, version, json.dumps(result), time.time()))
+
+def get_recommendations(username, platform):
+    """
+    Stored recommendations as {'version', 'result', 'computed_at'}, or None
+    """
+    with connection() as c:
+        c.execute('SELECT version, result, computed_at FROM recommendations WHERE username=? AND platform=?',
+                  (username, platform))
+        row = c.fetchone()
+    if not row:
+        return None
+    return {'version': row[0], 'result': json.loads(row[1]), 'computed_at': row[2]}
+
+def save_interest_vector(username, vector, list_id):
+    """
+    Upsert a user's interest vector, returning the new interest index data version
+    """
+    with transaction() as c:
+        c.execute('INSERT OR REPLACE INTO interest_vectors VALUES (?, ?, ?, ?)',
+                  (username, vector, list_id, time.time()))
+        return _bump_data_version(c, INTEREST_INDEX_DATA)
+
+def get_interest_vectors():
+    """
+    Every stored interest vector as (username, vector_bytes, list_id)
+    """
+    with connection() as c:
+        c.execute('SELECT username, vector, list_id FROM interest_vectors ORDER BY username')
+        return c.fetchall()
+
+def save_interest_centroids(centroids, assignments):
+    """
+    Replace the index's centroids (list of vector bytes, position = list id)
+    and move users to their new lists ({username: list_id}), returning the
+    new interest index data version
+    """
+    with transaction() as c:
+        c.execute('DELETE FROM interest_centroids')
+        c.executemany('INSERT INTO interest_centroids VALUES (?, ?)', list(enumerate(centroids)))
+        c.executemany('UPDATE interest_vectors SET list_id=? WHERE username=?',
+                      [(list_id, username) for username, list_id in assignments.items()])
+        return _bump_data_version(c, INTEREST_INDEX_DATA)
+
+def get_interest_centroids():
+    with connection() as c:
+        c.execute('SELECT vector FROM interest_centroids ORDER BY list_id')
+        return [row[0] for row in c.fetchall()]
+
+def save_interest_profile(username, platform, topics, vector):
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO interest_profiles (username, platform, topics, vector, updated_at)
+                     VALUES (?, ?, ?, ?, ?)''', (username, platform, json.dumps(topics), vector, time.time()))
+
+def get_interest_profile(username, platform):
+    """
+    Stored interest profile as {'topics', 'vector' (bytes or None), 'updated_at'}, or None
+    """
+    with connection() as c:
+        c.execute('SELECT topics, vector, updated_at FROM interest_profiles WHERE username=? AND platform=?',
+                  (username, platform))
+        row = c.fetchone()
+    if not row:
+        return None
+    return {'topics': json.loads(row[0]), 'vector': row[1], 'updated_at': row[2]}
+
+def get_interest_profile_vectors(platform):
+    """
+    Every stored profile for a platform as (username, topics, vector_bytes or None)
+    """
+    with connection() as c:
+        c.execute('SELECT username, topics, vector FROM interest_profiles WHERE platform=? ORDER BY username',
+                  (platform,))
+        return [(row[0], json.loads(row[1]), row[2]) for row in c.fetchall()]
+
+def _migrate_legacy_posts(c):
+    """
+    Move posts from the table stored before authors were numbered (renamed
+    to legacy_posts) into posts, keeping their ids, then drop it. Their text
+    stays uncompressed until post_store.py compress re-encodes it.
+    """
+    c.execute('INSERT INTO post_authors (did) SELECT DISTINCT did FROM legacy_posts WHERE true ON CONFLICT(did) DO NOTHING')
+    c.execute('''INSERT INTO posts (id, author, position, text)
+                 SELECT lp.id, pa.id, lp.position, lp.text FROM legacy_posts lp JOIN post_authors pa ON pa.did = lp.did''')
+    c.execute('DROP TABLE legacy_posts')
+
+def _migrate_json_tables(c):
+    """
+    Move rows from the old one-JSON-blob-per-user tables into the normalized
+    tables, then drop the old tables so this only ever runs once.
+    """
+    legacy_tables = {row[0] for row in c.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name IN "
+        "('following_data', 'potential_connections', 'reddit_subscriptions')")}
+    
+    if 'following_data' in legacy_tables:
+        for username, data in c.execute('SELECT username, following_data FROM following_data').fetchall():
+            if data:
+                _save_following_data(c, username, json.loads(data))
+        c.execute('DROP TABLE following_data')
+    
+    if 'potential_connections' in legacy_tables:
+        for username, data in c.execute('SELECT username, connections_data FROM potential_connections').fetchall():
+            if data:
+                _save_potential_connections(c, username, json.loads(data))
+        c.execute('DROP TABLE potential_connections')
+    
+    if 'reddit_subscriptions' in legacy_tables:
+        for username, data in c.execute('SELECT username, subscriptions_data FROM reddit_subscriptions').fetchall():
+            if data:
+                _save_reddit_subscriptions(c, username, json.loads(data))
+        c.execute('DROP TABLE reddit_subscriptions')
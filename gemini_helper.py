@@ -1,26 +1,248 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import google.generativeai as genai
 
+from database import get_cached_response, save_cached_response
+from local_interests import extract_local_interests
+
+CACHE_TTL = 7 * 24 * 60 * 60  # Seconds before a cached response is regenerated
+CACHE_MAX_ENTRIES = 5000  # Least recently used responses beyond this are evicted
+INTEREST_BATCH_SIZE = 8  # Users whose posts are packed into one interest extraction request
+MAX_CONCURRENT_REQUESTS = 4  # Batched extraction requests in flight at once
+
+MAX_TOPICS = 5
+
+# Structured output for interest extraction: weighted topics, and for batches one entry per numbered user
+INTEREST_TOPICS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "label": {"type": "string"},
+            "emoji": {"type": "string"},
+            "weight": {"type": "number"}
+        },
+        "required": ["label", "emoji", "weight"]
+    }
+}
+INTEREST_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "user": {"type": "integer"},
+            "topics": INTEREST_TOPICS_SCHEMA
+        },
+        "required": ["user", "topics"]
+    }
+}
+
+# Process-wide cache counters, shown in the sidebar
+cache_stats = {"hits": 0, "misses": 0}
+_cache_stats_lock = threading.Lock()
+
 def setup_gemini(api_key, temperature=0.7):
     genai.configure(api_key=api_key)
     return genai.GenerativeModel('gemini-2.0-flash', 
                                 generation_config={"temperature": temperature})
 
-def analyze_interests(model, posts_data):
-    prompt = f"""Extract TOP 3-5 main interests from these posts. 
-Format as numbered list with emoji prefixes. Max 10 words per interest.
+def _cache_key(model, prompt):
+    # Same model, temperature and prompt text -> same cache entry
+    config = getattr(model, '_generation_config', None) or {}
+    raw = f"{model.model_name}\x00{config.get('temperature')}\x00{prompt}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _count(stat):
+    with _cache_stats_lock:
+        cache_stats[stat] += 1
+
+def stream_text(model, prompt, use_cache=True):
+    # Yield response text as Gemini streams it; the full text is cached once the stream completes.
+    # A cache hit is yielded as a single chunk. A stream without any text (e.g. a safety block)
+    # raises ValueError like response.text does, and is not cached.
+    key = _cache_key(model, prompt)
+    if use_cache:
+        cached = get_cached_response(key, CACHE_TTL)
+        if cached is not None:
+            _count("hits")
+            yield cached
+            return
+        _count("misses")
+    
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. a final safety/finish chunk)
+            continue
+        parts.append(text)
+        yield text
+    
+    if not parts:
+        raise ValueError("Gemini returned no text for this prompt")
+    if use_cache:
+        save_cached_response(key, model.model_name, "".join(parts), CACHE_MAX_ENTRIES)
+
+def _json_config(schema):
+    return genai.GenerationConfig(response_mime_type="application/json", response_schema=schema)
+
+def generate_text(model, prompt, use_cache=True, on_chunk=None):
+    # Serve repeated prompts from the SQLite cache instead of another Gemini round trip.
+    # With on_chunk, the response is streamed and on_chunk gets the text received so far.
+    if on_chunk:
+        text = ""
+        for part in stream_text(model, prompt, use_cache):
+            text += part
+            on_chunk(text)
+        return text
+    
+    key = _cache_key(model, prompt)
+    if use_cache:
+        cached = get_cached_response(key, CACHE_TTL)
+        if cached is not None:
+            _count("hits")
+            return cached
+        _count("misses")
+    
+    text = model.generate_content(prompt).text
+    if use_cache:
+        save_cached_response(key, model.model_name, text, CACHE_MAX_ENTRIES)
+    return text
+
+def _interests_prompt(posts_data):
+    return f"""Extract TOP 3-5 main interests from these posts.
+For each interest give a label of at most 10 words, one emoji, and a weight
+between 0 and 1 for how strongly the posts show it.
 
 Posts:
-{posts_data}
+{posts_data}"""
+
+def _parse_topics(entries):
+    # Keep well-formed topics, strongest first, with weights normalized to sum to 1
+    topics = []
+    for entry in entries or []:
+        label = str(entry.get("label") or "").strip()
+        if not label:
+            continue
+        try:
+            weight = max(float(entry.get("weight") or 0), 0.0)
+        except (TypeError, ValueError):
+            weight = 0.0
+        topics.append({"label": label, "emoji": str(entry.get("emoji") or "").strip(), "weight": weight})
+    topics = sorted(topics, key=lambda topic: -topic["weight"])[:MAX_TOPICS]
+    total = sum(topic["weight"] for topic in topics)
+    for topic in topics:
+        topic["weight"] = topic["weight"] / total if total else 1 / len(topics)
+    return topics
 
-Respond ONLY with the formatted list, nothing else."""
+def format_interests(topics):
+    """
+    Numbered, emoji-prefixed markdown list of extracted topics
+    """
+    return "\n".join(f"{position}. " + " ".join(filter(None, [topic.get("emoji"), topic["label"]]))
+                     for position, topic in enumerate(topics, 1))
+
+def extract_interests(model, posts_data, use_cache=True):
+    """
+    Main interests in posts_data as weighted topics, [{"label", "emoji",
+    "weight"}] with weights summing to 1, via a structured-output request.
+    Returns [] if Gemini fails.
+    """
+    prompt = _interests_prompt(posts_data)
+    key = _cache_key(model, prompt)
+    if use_cache:
+        cached = get_cached_response(key, CACHE_TTL)
+        if cached is not None:
+            _count("hits")
+            return json.loads(cached)
+        _count("misses")
     
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        topics = _parse_topics(json.loads(
+            model.generate_content(prompt, generation_config=_json_config(INTEREST_TOPICS_SCHEMA)).text))
     except Exception as e:
-        return "1. 📱 Technology\n2. 💻 Programming\n3. 🤖 AI and Machine Learning"
+        print(f"Interest extraction failed: {e}")
+        return []
+    if use_cache and topics:
+        save_cached_response(key, model.model_name, json.dumps(topics), CACHE_MAX_ENTRIES)
+    return topics
 
-def suggest_connections(model, my_interests, potential_connections_data):
+def analyze_interests(model, posts_data):
+    # Without a model, or if Gemini fails, topics come from the local extractor
+    # (posts_data lines are "author: text", and only the text says anything about interests)
+    topics = extract_interests(model, posts_data) if model else []
+    if not topics:
+        topics = extract_local_interests([line.partition(": ")[2] or line for line in posts_data.splitlines()])
+    return format_interests(topics)
+
+def _extract_interests_batch(model, batch):
+    # One structured-output request for a list of (key, posts_data); returns {key: topics}
+    # for the users the response covers
+    sections = "\n\n".join(f"=== User {number} ===\n{posts_data}" for number, (_, posts_data) in enumerate(batch))
+    prompt = f"""For each user below, extract their TOP 3-5 main interests from their posts.
+For each interest give a label of at most 10 words, one emoji, and a weight
+between 0 and 1 for how strongly the posts show it.
+
+{sections}
+
+Return one entry per user, with the user's number in "user"."""
+    response = model.generate_content(prompt, generation_config=_json_config(INTEREST_BATCH_SCHEMA))
+    
+    extracted = {}
+    for entry in json.loads(response.text):
+        number, topics = entry.get("user"), _parse_topics(entry.get("topics"))
+        if isinstance(number, int) and 0 <= number < len(batch) and topics:
+            extracted[batch[number][0]] = topics
+    return extracted
+
+def analyze_interests_batch(model, corpora, batch_size=INTEREST_BATCH_SIZE, max_concurrency=MAX_CONCURRENT_REQUESTS):
+    """
+    Interests for many users at once: corpora maps any key (e.g. (username,
+    platform)) to the posts_data extract_interests would get, and the result
+    maps each key to its weighted topics.
+
+    Cached users cost nothing; the rest are packed batch_size to a request and
+    up to max_concurrency requests run at once. Each result is cached under
+    the same key as extract_interests' prompt, so a later single-user call
+    for unchanged posts is a cache hit. Users a batch fails to cover fall back
+    to extract_interests.
+    """
+    results = {}
+    pending = []
+    for key, posts_data in corpora.items():
+        cached = get_cached_response(_cache_key(model, _interests_prompt(posts_data)), CACHE_TTL)
+        if cached is not None:
+            _count("hits")
+            results[key] = json.loads(cached)
+        else:
+            pending.append((key, posts_data))
+    
+    def extract(batch):
+        try:
+            extracted = _extract_interests_batch(model, batch)
+        except Exception as e:
+            print(f"Batched interest extraction failed for {len(batch)} users: {e}")
+            extracted = {}
+        for key, posts_data in batch:
+            if key in extracted:
+                _count("misses")
+                save_cached_response(_cache_key(model, _interests_prompt(posts_data)), model.model_name,
+                                     json.dumps(extracted[key]), CACHE_MAX_ENTRIES)
+            else:
+                extracted[key] = extract_interests(model, posts_data)
+        return extracted
+    
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        for extracted in pool.map(extract, batches):
+            results.update(extracted)
+    return results
+
+def suggest_connections(model, my_interests, potential_connections_data, on_chunk=None):
     prompt = f"""
     Based on the following interests:
     {my_interests}
@@ -33,7 +255,36 @@ def suggest_connections(model, my_interests, potential_connections_data):
     """
     
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        return generate_text(model, prompt, on_chunk=on_chunk)
+    except Exception as e:
+        # Callers fall back to locally generated recommendations
+        print(f"Could not generate suggestions: {e}")
+        return ""
+
+def suggest_reddit_connections(model, my_interests, subreddit_info, on_chunk=None, related_info=""):
+    related_section = f"""
+    Users with overlapping subscriptions are also active in these subreddits:
+    {related_info}
+    Prefer these when suggesting where the accounts are active.
+    """ if related_info else ""
+    prompt = f"""
+    Based on the following interests:
+    {my_interests}
+    
+    And these subreddits the user is subscribed to:
+    {subreddit_info}
+    {related_section}
+    Suggest 5 people/accounts they might want to follow on Reddit based on these interests.
+    For each suggestion:
+    1. Provide a username (can be fictional but realistic)
+    2. Explain why they would be a good connection
+    3. Mention which subreddits they're likely active in
+    
+    Format each suggestion with a clear heading and bullet points.
+    """
+    
+    try:
+        return generate_text(model, prompt, on_chunk=on_chunk)
     except Exception as e:
-        return "Could not generate suggestions at this time."
\ No newline at end of file
+        print(f"Could not generate Reddit recommendations: {e}")
+        return ""
\ No newline at end of file
@@ -0,0 +1,193 @@
+import numpy as np
+
+from database import (
+    get_following_data, get_potential_connections, get_reddit_subscriptions, get_reddit_activity, save_interest_vector,
+    get_interest_vectors, save_interest_centroids, get_interest_centroids, VersionedCache, INTEREST_INDEX_DATA
+)
+from array_utils import top_indices
+from ranking import candidate_document, hashed_vector
+
+VECTOR_DIM = 512
+MIN_TRAIN_SIZE = 1024  # Below this many users every query is an exact scan
+RETRAIN_GROWTH = 2  # Re-cluster once the index has grown this many times since the last training
+DEFAULT_NPROBE = 8  # Closest lists scanned per query
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000  # Vectors sampled to train centroids
+
+
+
+class InterestIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbor index over unit-length
+    user interest vectors, in NumPy.
+
+    Vectors are clustered with spherical k-means into about sqrt(n) lists; a
+    query scores the centroids, then only the vectors in its nprobe closest
+    lists. Inserts are assigned to their nearest existing list, and the lists
+    are retrained once the index has doubled in size. Small indexes are
+    searched exhaustively.
+    """
+    def __init__(self, dim=VECTOR_DIM):
+        self.dim = dim
+        self.usernames = []
+        self.positions = {}
+        self._vectors = np.zeros((16, dim), dtype=np.float32)
+        self._lists = np.full(16, -1, dtype=np.int32)
+        self.centroids = None
+        self.trained_size = 0
+        self._order = None  # Rows grouped by list, rebuilt lazily after writes
+        self._offsets = None
+        self._grouped_vectors = None
+
+    def __len__(self):
+        return len(self.usernames)
+
+    @property
+    def vectors(self):
+        return self._vectors[:len(self.usernames)]
+
+    @property
+    def lists(self):
+        return self._lists[:len(self.usernames)]
+
+    def add(self, username, vector, list_id=None):
+        """
+        Insert or replace username's vector. Returns the list it was put in
+        (-1 while untrained), assigning the nearest one unless list_id is given.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        row = self.positions.get(username)
+        if row is None:
+            row = len(self.usernames)
+            if row == len(self._vectors):
+                self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                self._lists = np.concatenate([self._lists, np.full_like(self._lists, -1)])
+            self.positions[username] = row
+            self.usernames.append(username)
+        if list_id is None:
+            list_id = int(np.argmax(self.centroids @ vector)) if self.centroids is not None else -1
+        self._vectors[row] = vector
+        self._lists[row] = list_id
+        self._order = None
+        return list_id
+
+    def needs_training(self):
+        return len(self) >= MIN_TRAIN_SIZE and len(self) >= RETRAIN_GROWTH * self.trained_size
+
+    def train(self, seed=0):
+        """
+        Cluster the stored vectors and reassign every row. Returns {username: list_id}.
+        """
+        rng = np.random.default_rng(seed)
+        vectors = self.vectors
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Lists that lost every member keep their previous centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        self.centroids = centroids.astype(np.float32)
+        self._lists[:len(vectors)] = np.argmax(vectors @ self.centroids.T, axis=1)
+        self.trained_size = len(vectors)
+        self._order = None
+        return {username: int(list_id) for username, list_id in zip(self.usernames, self.lists)}
+
+    def _grouped(self):
+        if self._order is None:
+            self._order = np.argsort(self.lists, kind="stable").astype(np.int32)
+            self._offsets = np.searchsorted(self.lists[self._order], np.arange(len(self.centroids) + 1))
+            # Contiguous copy so each probed list is scored as one slice, without a gather
+            self._grouped_vectors = self.vectors[self._order]
+        return self._order, self._offsets, self._grouped_vectors
+
+    def search(self, vector, top_k=10, nprobe=DEFAULT_NPROBE, exclude=None):
+        """
+        Approximate top_k most similar users to vector by cosine similarity,
+        as (username, score) pairs, best first
+        """
+        if not self.usernames:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.centroids is None or nprobe >= len(self.centroids):
+            rows = np.arange(len(self.usernames))
+            scores = self.vectors @ vector
+        else:
+            order, offsets, grouped = self._grouped()
+            probes = np.argpartition(-(self.centroids @ vector), nprobe - 1)[:nprobe]
+            # Rows added before the first training have no list yet (list -1, sorted first)
+            spans = [(0, offsets[0])] + [(offsets[p], offsets[p + 1]) for p in probes]
+            rows = np.concatenate([order[start:end] for start, end in spans])
+            if not len(rows):
+                return []
+            scores = np.concatenate([grouped[start:end] @ vector for start, end in spans])
+
+        if exclude is not None and exclude in self.positions:
+            scores[rows == self.positions[exclude]] = -np.inf
+        return [(self.usernames[rows[i]], float(scores[i])) for i in top_indices(scores, top_k)
+                if np.isfinite(scores[i])]
+
+
+def user_interest_text(username):
+    """
+    What a user's stored data says about their interests: followed accounts,
+    posts from their network, subreddit subscriptions and their own Reddit posts and comments
+    """
+    parts = [f"{f.get('handle') or ''} {f.get('display_name') or ''}" for f in get_following_data(username)]
+    parts += [candidate_document(c) for c in get_potential_connections(username)]
+    parts += [f"{s.get('name') or ''} {s.get('description') or ''}" for s in get_reddit_subscriptions(username)]
+    parts += [item["text"] for item in get_reddit_activity(username)]
+    return "\n".join(parts)
+
+
+def _load_index():
+    index = InterestIndex()
+    centroids = get_interest_centroids()
+    if centroids:
+        index.centroids = np.vstack([np.frombuffer(c, dtype=np.float32) for c in centroids])
+    for username, vector, list_id in get_interest_vectors():
+        index.add(username, np.frombuffer(vector, dtype=np.float32), -1 if list_id is None else list_id)
+    index.trained_size = len(index) if centroids else 0
+    return index
+
+
+_index_cache = VersionedCache(INTEREST_INDEX_DATA, _load_index)
+
+
+def get_interest_index():
+    """
+    The process-wide index, loaded from SQLite on first use and reloaded
+    once another process (e.g. reddit_ingest) has written vectors or centroids
+    """
+    return _index_cache.get()
+
+
+def update_user_vector(username):
+    """
+    Recompute a user's interest vector from their stored data and upsert it,
+    retraining the lists if the index has outgrown them
+    """
+    vector = hashed_vector(user_interest_text(username), VECTOR_DIM)
+    with _index_cache.lock:
+        index = get_interest_index()
+        list_id = index.add(username, vector)
+        _index_cache.written(save_interest_vector(username, vector.tobytes(), list_id))
+        if index.needs_training():
+            assignments = index.train()
+            _index_cache.written(save_interest_centroids([c.tobytes() for c in index.centroids], assignments))
+
+
+def similar_users(username, top_k=10):
+    """
+    Users whose interest vectors are closest to username's, as (username, score) pairs
+    """
+    with _index_cache.lock:
+        index = get_interest_index()
+        if username not in index.positions:
+            return []
+        vector = index.vectors[index.positions[username]].copy()
+        return index.search(vector, top_k, exclude=username)
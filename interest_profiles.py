@@ -0,0 +1,73 @@
+import numpy as np
+
+from database import save_interest_profile, get_interest_profile, get_interest_profile_vectors
+from array_utils import top_indices
+from ranking import hashed_vector
+
+TOPIC_DIM = 256
+PLATFORMS = ("bluesky", "reddit")
+
+
+def topic_vector(topics, dim=TOPIC_DIM):
+    """
+    Fixed-size, L2-normalized vector of weighted topics: the weight-scaled sum
+    of each label's hashed term vector, so profiles extracted at different
+    times and for different users compare directly
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for topic in topics:
+        vector += topic["weight"] * hashed_vector(topic["label"], dim)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _stored_vector(topics, vector):
+    # Profiles saved before vectors were stored have none; theirs is rebuilt from the topics
+    return topic_vector(topics) if vector is None else np.frombuffer(vector, dtype=np.float32)
+
+
+def save_profile(username, platform, topics):
+    """
+    Persist a user's extracted topics for platform with their topic vector
+    """
+    vector = topic_vector(topics)
+    save_interest_profile(username, platform, topics, vector.tobytes())
+    return vector
+
+
+def load_profile(username, platform):
+    """
+    Stored profile as {"topics", "vector", "updated_at"} with vector as a NumPy array, or None
+    """
+    profile = get_interest_profile(username, platform)
+    if profile:
+        profile["vector"] = _stored_vector(profile["topics"], profile["vector"])
+    return profile
+
+
+def profile_topics(username, platforms=PLATFORMS):
+    """
+    Topics from the user's stored profiles on platforms, strongest first
+    """
+    topics = []
+    for platform in platforms:
+        profile = get_interest_profile(username, platform)
+        if profile:
+            topics += profile["topics"]
+    return sorted(topics, key=lambda topic: -topic["weight"])
+
+
+def similar_profiles(username, platform, top_k=10):
+    """
+    Users whose topic vectors on platform are closest to username's, as
+    (username, score) pairs: one matrix-vector product over every stored profile
+    """
+    rows = get_interest_profile_vectors(platform)
+    usernames = [row[0] for row in rows]
+    if username not in usernames:
+        return []
+    vectors = np.vstack([_stored_vector(topics, vector) for _, topics, vector in rows])
+    position = usernames.index(username)
+    scores = vectors @ vectors[position]
+    scores[position] = -np.inf
+    return [(usernames[i], float(scores[i])) for i in top_indices(scores, top_k) if scores[i] > 0]
@@ -0,0 +1,321 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crawler import NetworkCrawler
+from database import (
+    create_job, update_job, get_latest_job, fail_interrupted_jobs, get_following_data,
+    get_potential_connections, get_reddit_subscriptions, get_reddit_activity, get_recommendations,
+    save_recommendations
+)
+from clients import get_bluesky_client, get_reddit_client, get_gemini_model
+from communities import load_community_index
+from graph import graph_rank_candidates
+from interest_index import update_user_vector, similar_users
+from gemini_helper import extract_interests, format_interests, suggest_connections, suggest_reddit_connections
+from interest_profiles import save_profile, similar_profiles
+from local_interests import extract_local_interests, describe_connections, describe_communities
+from ranking import rank_candidates, DEFAULT_TOP_K
+from reddit_ingest import ingest_user, fill_subreddit_metadata
+from sync import sync_following, walk_following, refresh_network
+
+MAX_WORKERS = 4  # Jobs running at once across every Streamlit session in this process
+ACTIVE_STATUSES = ('queued', 'running')
+PARTIAL_RESULT_INTERVAL = 0.5  # Seconds between streamed partial-result writes
+RECOMMENDATIONS_VERSION = 1  # Bump when recommendation results change shape so stored ones are recomputed
+RECOMMENDATIONS_MAX_AGE = 24 * 60 * 60  # Seconds before stored recommendations are refreshed
+FETCH_KINDS = {"bluesky": "bluesky_fetch", "reddit": "reddit_fetch"}
+MAX_ACTIVITY_CHARS = 200  # Per Reddit post or comment in the interest prompt
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+_submit_lock = threading.Lock()
+_handlers = {}
+_recovered = False
+
+
+def job_handler(kind):
+    """
+    Register a function as the handler for a job kind. Handlers receive a
+    report(progress, message, partial=None) callback plus the submitted
+    parameters and return a JSON-serializable result. A partial result passed
+    to report is visible to pollers before the job finishes.
+    """
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def submit_job(username, kind, **params):
+    """
+    Queue a job and return its id. If the user already has a job of this kind
+    queued or running, that job's id is returned instead of starting another.
+    """
+    with _submit_lock:
+        job = get_latest_job(username, kind)
+        if job and job['status'] in ACTIVE_STATUSES:
+            return job['id']
+        job_id = create_job(username, kind)
+    _executor.submit(_run_job, job_id, kind, username, params)
+    return job_id
+
+
+def recover_interrupted_jobs():
+    # Once per process: anything still queued/running belonged to a previous server
+    global _recovered
+    with _submit_lock:
+        if not _recovered:
+            fail_interrupted_jobs()
+            _recovered = True
+
+
+def _throttled(func, interval=PARTIAL_RESULT_INTERVAL):
+    # Drop calls arriving within interval seconds of the last one (the job's final result follows anyway)
+    last_call = [0.0]
+    def call(*args, **kwargs):
+        now = time.monotonic()
+        if now - last_call[0] >= interval:
+            last_call[0] = now
+            func(*args, **kwargs)
+    return call
+
+
+def is_active(job):
+    return bool(job) and job['status'] in ACTIVE_STATUSES
+
+
+def get_stored_recommendations(username, platform, max_age=RECOMMENDATIONS_MAX_AGE, llm_available=False):
+    """
+    Materialized recommendations for a platform as (result, stale), or (None, True)
+    if none are stored. Results are stale when older than max_age, produced by
+    an older RECOMMENDATIONS_VERSION or computed before the user's latest fetch,
+    and with llm_available, when they were generated without Gemini.
+    """
+    stored = get_recommendations(username, platform)
+    if not stored:
+        return None, True
+    fetch = get_latest_job(username, FETCH_KINDS[platform])
+    stale = (stored['version'] != RECOMMENDATIONS_VERSION
+             or time.time() - stored['computed_at'] > max_age
+             or bool(fetch and fetch['status'] == 'done' and fetch['updated_at'] > stored['computed_at'])
+             or (llm_available and stored['result'].get('source') == 'local'))
+    return stored['result'], stale
+
+
+def _run_job(job_id, kind, username, params):
+    def report(progress, message, partial=None):
+        if partial is None:
+            update_job(job_id, progress=progress, message=message)
+        else:
+            update_job(job_id, progress=progress, message=message, result=partial)
+
+    update_job(job_id, status='running')
+    try:
+        result = _handlers[kind](report, username, **params)
+        update_job(job_id, status='done', progress=1.0, message=None, result=result)
+    except Exception as e:
+        print(f"Job {job_id} ({kind}) failed: {e}")
+        update_job(job_id, status='failed', error=str(e))
+
+
+@job_handler("bluesky_fetch")
+def fetch_bluesky(report, username, bluesky_username, bluesky_password, incremental=True, crawl=True,
+                  crawl_followees=3, followers_limit=10, max_workers=8, requests_per_second=10):
+    report(0.0, "Connecting to Bluesky...")
+    client = get_bluesky_client(bluesky_username, bluesky_password)
+
+    if incremental and get_following_data(username, limit=1):
+        # Only read follows added since the last fetch
+        following, added, removed = sync_following(client, username)
+        report(0.2, f"Following: {len(added)} new, {len(removed)} removed ({len(following)} total)")
+    else:
+        # Persist page by page so the Following page can show partial results and an
+        # interrupted walk resumes from its last page
+        following = walk_following(client, username,
+                                   on_page=lambda count: report(0.1, f"Fetched {count} followed accounts..."))
+
+    summary = f"Fetched {len(following)} followed accounts."
+    if crawl:
+        crawler = NetworkCrawler(client, max_workers=max_workers, requests_per_second=requests_per_second)
+        steps = iter([0.3, 0.45, 0.6, 0.75, 0.9])
+        potential_connections = refresh_network(
+            crawler,
+            username,
+            [f["did"] for f in following[:crawl_followees]],
+            followers_limit=followers_limit,
+            posts_limit=3,
+            incremental=incremental,
+            on_progress=lambda message: report(next(steps, 0.9), message)
+        )
+        summary += f" Found {len(potential_connections)} potential connections. Network crawl: {crawler.stats.summary()}"
+
+    report(0.95, "Updating your interest profile...")
+    update_user_vector(username)
+    return {"summary": summary}
+
+
+@job_handler("reddit_fetch")
+def fetch_reddit(report, username, reddit_username, reddit_password):
+    report(0.0, "Connecting to Reddit...")
+    reddit_client = get_reddit_client(reddit_username, reddit_password)
+    if not reddit_client:
+        raise ValueError("Failed to initialize Reddit client. Please check your credentials.")
+
+    report(0.3, "Fetching subscribed subreddits and recent activity...")
+    subreddits, activity = ingest_user(username, reddit_client, reddit_username)
+
+    report(0.7, "Fetching details of active subreddits...")
+    fill_subreddit_metadata(reddit_client, [item["subreddit"] for item in activity])
+
+    report(0.9, "Updating your interest profile...")
+    update_user_vector(username)
+    return {"summary": f"Successfully fetched {len(subreddits)} subreddit subscriptions "
+                       f"and {len(activity)} recent posts and comments!"}
+
+
+def _similar_users(username, neighbors):
+    # Nearest users by the interest index and by Bluesky topic profile, a user found by
+    # both scoring the sum of their two cosine similarities
+    scores = {}
+    for other, score in similar_users(username, neighbors) + similar_profiles(username, "bluesky", neighbors):
+        if score > 0:
+            scores[other] = scores.get(other, 0) + score
+    return sorted(scores, key=lambda other: -scores[other])[:neighbors]
+
+
+def _accounts_followed_by_similar_users(username, top_k=DEFAULT_TOP_K, neighbors=10):
+    # Accounts the most similar users follow and username does not yet
+    followed = {f["did"] for f in get_following_data(username)}
+    counts = {}
+    for other in _similar_users(username, neighbors):
+        for follow in get_following_data(other):
+            if follow["did"] not in followed:
+                entry = counts.setdefault(follow["did"], dict(follow, followed_by=0))
+                entry["followed_by"] += 1
+    return sorted(counts.values(), key=lambda entry: -entry["followed_by"])[:top_k]
+
+
+def interest_corpus(username, platform):
+    """
+    The text extract_interests reads for a user on a platform ("" without data):
+    posts from the first potential connections on Bluesky, subreddit
+    descriptions and the user's own newest posts and comments on Reddit
+    """
+    if platform == "bluesky":
+        lines = [f"{conn.get('handle', 'unknown')}: {post}"
+                 for conn in get_potential_connections(username, limit=5)  # Limit to first 5 for performance
+                 for post in conn.get("posts", [])]
+    else:
+        lines = [f"r/{sub.get('name', '')}: {sub.get('description', '')}"
+                 for sub in get_reddit_subscriptions(username, limit=10)]
+        lines += [f"r/{item['subreddit']}: {item['text'][:MAX_ACTIVITY_CHARS]}"
+                  for item in get_reddit_activity(username, limit=10)]
+    return "\n".join(lines)
+
+
+def interest_documents(username, platform):
+    # Individual texts for the local extractor, which needs more than the few posts sent to Gemini
+    if platform == "bluesky":
+        return [post for conn in get_potential_connections(username) for post in conn.get("posts", [])]
+    return ([f"{sub.get('name') or ''} {sub.get('description') or ''}" for sub in get_reddit_subscriptions(username)]
+            + [item["text"] for item in get_reddit_activity(username)])
+
+
+def _analyze_interests(model, username, platform, corpus):
+    # Weighted topics plus their markdown list, from Gemini or, without a model or if it fails, the
+    # local extractor. Extracted topics are stored as the user's profile.
+    topics = extract_interests(model, corpus) if model and corpus else []
+    if not topics and corpus:
+        topics = extract_local_interests(interest_documents(username, platform))
+    if not topics:
+        return [], ""
+    save_profile(username, platform, topics)
+    return topics, format_interests(topics)
+
+
+@job_handler("bluesky_recommendations")
+def recommend_bluesky(report, username, api_key=None, temperature=0.7, graph=None):
+    # Without an API key interests and recommendations are computed locally. graph is a
+    # FollowGraph to rank with, for batch runs that build one for every user.
+    model = get_gemini_model(api_key, temperature) if api_key else None
+
+    report(0.1, "Analyzing your Bluesky interests...")
+    topics, interests = _analyze_interests(model, username, "bluesky", interest_corpus(username, "bluesky"))
+
+    recommendations = ""
+    source = "local"
+    if interests:
+        # Rank every candidate locally and only send the best matches to Gemini.
+        # Graph order comes first so it breaks ties between equally relevant candidates.
+        report(0.5, "Ranking potential connections...")
+        potential_connections = graph_rank_candidates(username, get_potential_connections(username), graph=graph)
+        ranked_connections = rank_candidates(potential_connections, interests, topics=topics)
+        if not ranked_connections:
+            # No vocabulary overlap at all, fall back to graph order
+            ranked_connections = [(conn, 0.0) for conn in potential_connections[:DEFAULT_TOP_K]]
+
+        connections_data = ""
+        for conn, score in ranked_connections:
+            connections_data += f"User: {conn.get('handle', '')} ({conn.get('name', '')})\n"
+            connections_data += f"Mutual follows: {conn.get('mutual', 0)}\n"
+            connections_data += f"Posts:\n" + "\n".join(conn.get("posts", [])[:2]) + "\n\n"  # Limit to 2 posts
+
+        if connections_data and model:
+            report(0.7, "Generating recommendations...")
+            recommendations = suggest_connections(
+                model, interests, connections_data,
+                on_chunk=_throttled(lambda text: report(0.8, "Generating recommendations...",
+                                                        partial={"interests": interests, "recommendations": text}))
+            )
+            source = "gemini" if recommendations else "local"
+        if not recommendations:
+            recommendations = describe_connections(ranked_connections, topics)
+
+    result = {"interests": interests, "recommendations": recommendations,
+              "similar_accounts": _accounts_followed_by_similar_users(username), "source": source}
+    if interests:
+        save_recommendations(username, "bluesky", RECOMMENDATIONS_VERSION, result)
+    return result
+
+
+@job_handler("reddit_recommendations")
+def recommend_reddit(report, username, api_key=None, temperature=0.7, index=None):
+    # index is a CommunityIndex to recommend from, for batch runs that build one for every user
+    model = get_gemini_model(api_key, temperature) if api_key else None
+    reddit_subs = get_reddit_subscriptions(username)
+
+    # Co-membership recommendations are computed locally over every user's subscriptions
+    report(0.05, "Finding related communities...")
+    if index is None:
+        index = load_community_index()
+    communities = [{"name": name, "score": score} for name, score in index.recommend_communities(username)]
+    similar_users = [{"username": name, "score": score} for name, score in index.similar_users(username)]
+
+    report(0.1, "Analyzing your Reddit interests...")
+    topics, interests = _analyze_interests(model, username, "reddit", interest_corpus(username, "reddit"))
+
+    recommendations = ""
+    source = "local"
+    if interests and model:
+        subreddit_info = ""
+        for sub in reddit_subs:
+            subreddit_info += f"Subreddit: r/{sub.get('name', '')}\n"
+            subreddit_info += f"Subscribers: {sub.get('subscribers', 'Unknown')}\n"
+            subreddit_info += f"Description: {sub.get('description', '')}\n\n"
+
+        report(0.5, "Generating recommendations...")
+        recommendations = suggest_reddit_connections(
+            model, interests, subreddit_info,
+            on_chunk=_throttled(lambda text: report(0.8, "Generating recommendations...",
+                                                    partial={"interests": interests, "recommendations": text})),
+            related_info="\n".join(f"r/{c['name']}" for c in communities)
+        )
+        source = "gemini" if recommendations else "local"
+    if interests and not recommendations:
+        recommendations = describe_communities(topics, reddit_subs, communities)
+
+    result = {"interests": interests, "recommendations": recommendations,
+              "communities": communities, "similar_users": similar_users, "source": source}
+    if interests:
+        save_recommendations(username, "reddit", RECOMMENDATIONS_VERSION, result)
+    return result
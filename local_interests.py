@@ -0,0 +1,120 @@
+import numpy as np
+
+from ranking import TfidfIndex, candidate_document, tokenize
+
+MAX_TOPICS = 5
+MIN_NMF_DOCUMENTS = 6  # Fewer documents than this are summarized by their top keywords instead
+NMF_ITERATIONS = 150
+TERMS_PER_LABEL = 3
+TOPIC_EMOJI = "🔹"
+EPSILON = 1e-9
+
+
+def _nmf(matrix, n_topics, seed=0, iterations=NMF_ITERATIONS):
+    # Multiplicative-update NMF of a sparse non-negative matrix, matrix ~= W @ H
+    rng = np.random.default_rng(seed)
+    scale = np.sqrt(matrix.sum() / (matrix.shape[0] * matrix.shape[1] * n_topics))
+    W = rng.random((matrix.shape[0], n_topics)).astype(np.float32) * scale + EPSILON
+    H = rng.random((n_topics, matrix.shape[1])).astype(np.float32) * scale + EPSILON
+    for _ in range(iterations):
+        H *= (matrix.T @ W).T / (W.T @ W @ H + EPSILON)
+        W *= (matrix @ H.T) / (W @ (H @ H.T) + EPSILON)
+    return W, H
+
+
+def _topic(terms, weight):
+    return {"label": ", ".join(terms), "emoji": TOPIC_EMOJI, "weight": float(weight)}
+
+
+def _normalized(topics):
+    total = sum(topic["weight"] for topic in topics)
+    for topic in topics:
+        topic["weight"] = topic["weight"] / total if total else 1 / len(topics)
+    return topics
+
+
+def extract_local_interests(documents, max_topics=MAX_TOPICS, seed=0):
+    """
+    Main interests in documents (post texts, subreddit descriptions) without
+    an LLM, as weighted topics in the same [{"label", "emoji", "weight"}]
+    shape as gemini_helper.extract_interests.
+
+    Topics come from an NMF model of the documents' TF-IDF matrix, each
+    labelled by its strongest terms and weighted by its share of the corpus.
+    Small corpora are summarized by their highest-scoring keywords instead.
+    """
+    documents = [document for document in documents if tokenize(document)]
+    if not documents:
+        return []
+    index = TfidfIndex(documents)
+    terms = np.array(sorted(index.vocabulary, key=index.vocabulary.get))
+
+    n_topics = min(max_topics, len(documents) // 2, len(terms))
+    if len(documents) < MIN_NMF_DOCUMENTS or n_topics < 2:
+        scores = np.asarray(index.matrix.sum(axis=0)).ravel()
+        top = np.argsort(-scores, kind="stable")[:max_topics]
+        return _normalized([_topic([terms[i]], scores[i]) for i in top])
+
+    W, H = _nmf(index.matrix, n_topics, seed)
+    strengths = W.sum(axis=0) * H.sum(axis=1)
+    topics = []
+    seen = set()
+    for k in np.argsort(-strengths, kind="stable"):
+        label_terms = [terms[i] for i in np.argsort(-H[k], kind="stable")[:TERMS_PER_LABEL] if H[k, i] > EPSILON]
+        if not label_terms or label_terms[0] in seen:
+            continue
+        seen.add(label_terms[0])
+        topics.append(_topic(label_terms, strengths[k]))
+    return _normalized(topics)
+
+
+def _topic_terms(topics):
+    return {term for topic in topics for term in tokenize(topic["label"])}
+
+
+def describe_connections(ranked_connections, topics, limit=5):
+    """
+    Markdown recommendations for ranked (candidate, score) pairs without an
+    LLM: each candidate with the interest terms their posts share
+    """
+    interest_terms = _topic_terms(topics)
+    lines = []
+    for candidate, score in ranked_connections[:limit]:
+        shared = [term for term in dict.fromkeys(tokenize(candidate_document(candidate)))
+                  if term in interest_terms][:TERMS_PER_LABEL]
+        reasons = []
+        if shared:
+            reasons.append(f"posts about {', '.join(shared)}")
+        if candidate.get("mutual"):
+            reasons.append(f"{candidate['mutual']} mutual follows")
+        reason = " and ".join(reasons) or "close to you in your follow network"
+        lines.append(f"### @{candidate.get('handle', '')}\n"
+                     f"- {candidate.get('name') or candidate.get('handle', '')}: {reason}\n"
+                     f"- Match score: {score:.2f}\n")
+    return "\n".join(lines)
+
+
+def describe_communities(topics, subscriptions, communities, limit=5):
+    """
+    Markdown Reddit recommendations without an LLM: for each interest topic
+    the user's subscriptions that match it, then related communities from
+    the co-membership index
+    """
+    lines = []
+    documents = [f"{sub.get('name') or ''} {sub.get('description') or ''}" for sub in subscriptions]
+    index = TfidfIndex(documents) if documents else None
+    listed = set()
+    for topic in topics:
+        if index is None:
+            break
+        scores = index.score(topic["label"])
+        matches = [subscriptions[i]["name"] for i in np.argsort(-scores, kind="stable")[:3]
+                   if scores[i] > 0 and subscriptions[i]["name"] not in listed]
+        listed.update(matches)
+        if matches:
+            lines.append(f"### {topic['emoji']} {topic['label']}\n"
+                         f"- Look for active members of " + ", ".join(f"r/{name}" for name in matches) + "\n")
+    if communities:
+        lines.append("### Communities to explore\n"
+                     + "".join(f"- r/{community['name']}\n" for community in communities[:limit]))
+    return "\n".join(lines)
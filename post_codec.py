@@ -0,0 +1,87 @@
+import re
+import zlib
+from collections import Counter
+
+DICTIONARY_SIZE = 32768  # Bytes of shared context, the most a zlib window can reach back
+MAX_NGRAM = 3  # Longest word sequence considered for the dictionary
+MIN_NGRAM_COUNT = 3  # Sequences seen fewer times in the sample are left out
+COMPRESSION_LEVEL = 9
+HEADER_BYTES = 4  # Big-endian id of the dictionary a post was compressed with, 0 for none
+
+_WORDS = re.compile(r"\S+\s*")
+_compressors = {}  # Dictionary -> (its id, compressor primed with it), copied for each post
+
+
+def dictionary_key(dictionary):
+    """
+    Id of a dictionary: its Adler-32 checksum, as zlib streams identify
+    theirs, so the same id never names two different dictionaries
+    """
+    return zlib.adler32(dictionary) if dictionary else 0
+
+
+def _compressor(dictionary):
+    # Priming zlib with a 32 KB dictionary costs more than compressing a post, so it is done once
+    entry = _compressors.get(dictionary)
+    if entry is None:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary) \
+            if dictionary else zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+        entry = _compressors[dictionary] = (dictionary_key(dictionary), compressor)
+    return entry[0], entry[1].copy()
+
+
+def train_dictionary(texts, size=DICTIONARY_SIZE):
+    """
+    Preset dictionary for compressing short posts: the word sequences that
+    save the most bytes across texts (count times length), most valuable
+    last since zlib encodes nearby matches more cheaply. Returns b"" when
+    texts share too little to be worth a dictionary.
+    """
+    counts = Counter()
+    for text in texts:
+        words = _WORDS.findall(text)
+        for n in range(1, MAX_NGRAM + 1):
+            counts.update("".join(words[i:i + n]) for i in range(len(words) - n + 1))
+
+    chosen = []
+    used = 0
+    for sequence, count in sorted(counts.items(), key=lambda item: -item[1] * len(item[0])):
+        if count < MIN_NGRAM_COUNT:
+            break
+        encoded = sequence.encode("utf-8")
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+def encode(text, dictionary=b""):
+    """
+    Stored form of a post's text: raw deflate after the id of the dictionary
+    used as bytes, or the text itself when compressing would not make it smaller
+    """
+    raw = text.encode("utf-8")
+    key, compressor = _compressor(dictionary)
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) + HEADER_BYTES >= len(raw):
+        return text
+    return key.to_bytes(HEADER_BYTES, "big") + compressed
+
+
+def dictionary_id(value):
+    # Id of the dictionary a stored value needs, None for plain text
+    return int.from_bytes(value[:HEADER_BYTES], "big") if isinstance(value, bytes) else None
+
+
+def decode(value, dictionaries):
+    """
+    Post text from its stored form. dictionaries maps ids to preset
+    dictionaries; a KeyError means the value's dictionary is not loaded.
+    """
+    if not isinstance(value, bytes):
+        return value
+    key = dictionary_id(value)
+    if not key:
+        return zlib.decompress(value[HEADER_BYTES:], -zlib.MAX_WBITS).decode("utf-8")
+    return zlib.decompressobj(-zlib.MAX_WBITS, zdict=dictionaries[key]).decompress(value[HEADER_BYTES:]).decode("utf-8")
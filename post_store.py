@@ -0,0 +1,96 @@
+"""
+Maintain and export the crawled post store:
+
+    python post_store.py compress [--sample 20000] [--vacuum]
+    python post_store.py export posts.parquet [--batch-size 50000]
+
+compress trains a new shared zlib dictionary on a sample of stored posts and
+re-encodes every post with it (one is trained automatically once enough posts
+are stored; re-run this after the crawl's topics drift). export writes every
+post as (uri, did, position, text) rows to a zstd-compressed Parquet file, or
+an Arrow IPC file for .arrow/.feather paths, for analytics tools. It needs
+the optional pyarrow package.
+"""
+import argparse
+import os
+import time
+
+from database import (
+    init_db, connection, transaction, iter_posts, train_post_dictionary, recompress_posts, DICTIONARY_SAMPLE
+)
+
+EXPORT_BATCH_SIZE = 50000
+ARROW_SUFFIXES = (".arrow", ".feather")
+
+
+def export_posts(path, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Write every stored post to path, batch by batch so memory stays bounded.
+    Returns the number of posts written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exporting posts requires pyarrow: pip install pyarrow")
+
+    schema = pa.schema([("uri", pa.string()), ("did", pa.string()), ("position", pa.int32()), ("text", pa.string())])
+    if path.endswith(ARROW_SUFFIXES):
+        writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    else:
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    written = 0
+    with writer:
+        for rows in iter_posts(batch_size):
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch([pa.array(column, type=field.type)
+                                                for column, field in zip(columns, schema)], schema=schema))
+            written += len(rows)
+    return written
+
+
+def compress_posts(sample_size=DICTIONARY_SAMPLE, vacuum=False):
+    """
+    Train a new dictionary and re-encode stored posts with it. Returns
+    (dictionary id or None, posts rewritten).
+    """
+    dictionary_id = train_post_dictionary(sample_size)
+    rewritten = recompress_posts() if dictionary_id else 0
+    if vacuum:
+        with transaction() as c:
+            # Merge the search index's segments first: deleted posts leave tombstones until then
+            c.execute("INSERT INTO posts_text (posts_text) VALUES ('optimize')")
+        with connection() as c:
+            c.execute('VACUUM')
+    return dictionary_id, rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    compress = commands.add_parser("compress", help="Train a new dictionary and re-encode stored posts")
+    compress.add_argument("--sample", type=int, default=DICTIONARY_SAMPLE, help="Posts sampled for training")
+    compress.add_argument("--vacuum", action="store_true",
+                          help="Shrink the search index and database file afterwards")
+    export = commands.add_parser("export", help="Write stored posts to a Parquet or Arrow file")
+    export.add_argument("path")
+    export.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    init_db()
+    started = time.monotonic()
+    if args.command == "compress":
+        dictionary_id, rewritten = compress_posts(args.sample, args.vacuum)
+        if dictionary_id is None:
+            print("Not enough stored posts to train a dictionary")
+        else:
+            print(f"Trained dictionary {dictionary_id} and re-encoded {rewritten} posts "
+                  f"in {time.monotonic() - started:.1f}s")
+    else:
+        written = export_posts(args.path, args.batch_size)
+        print(f"Exported {written} posts to {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB) "
+              f"in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
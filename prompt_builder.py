@@ -0,0 +1,108 @@
+import numpy as np
+
+from database import search_accounts_text, get_account_posts
+from interest_profiles import profile_topics
+from ranking import Bm25Index, candidate_document, tokenize
+
+DEFAULT_TOKEN_BUDGET = 3000  # Tokens of Bluesky + Reddit context per chat message
+MAX_POST_CHARS = 280  # Longer posts are truncated before packing
+CHARS_PER_TOKEN = 4  # Rough average for English text with Gemini's tokenizer
+RETRIEVAL_LIMIT = 30  # Accounts pulled from the full-text index per chat message
+# Words every recommendation request uses, which say nothing about the topic
+QUERY_STOPWORDS = frozenset("""
+bluesky reddit subreddit subreddits follow following account accounts user users people person
+recommend recommendation recommendations suggest find good want connect connections friends friend
+post posts posting
+""".split())
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _retrieve(query, documents):
+    """
+    Document indexes ordered by BM25 relevance to query. Documents that match
+    nothing keep their stored order after the matches, so a query with no
+    keyword overlap ("who should I follow?") still gets context.
+    """
+    if not documents:
+        return []
+    scores = Bm25Index(documents).score(query)
+    return list(np.argsort(-scores, kind="stable"))
+
+
+def _pack(entries, budget):
+    # Greedily take entries in order while they fit in the token budget
+    packed = []
+    used = 0
+    for entry in entries:
+        cost = estimate_tokens(entry)
+        if used + cost > budget:
+            continue
+        packed.append(entry)
+        used += cost
+    return packed, used
+
+
+def _format_candidate(candidate):
+    posts = [post[:MAX_POST_CHARS] for post in candidate.get("posts", []) if post]
+    return (f"User: {candidate.get('handle', '')} ({candidate.get('name') or ''})\n"
+            f"Posts:\n" + "\n".join(posts) + "\n\n")
+
+
+def _format_subreddit(subreddit):
+    return (f"Subreddit: r/{subreddit.get('name', '')}\n"
+            f"Description: {subreddit.get('description', '')}\n\n")
+
+
+def retrieve_candidates(query, username, stored_candidates=(), limit=RETRIEVAL_LIMIT):
+    """
+    Accounts from every crawled network whose posts or profile description
+    match the topic words of query (full-text BM25 in SQLite), followed by
+    the user's stored candidates that were not matched. Accounts the user
+    already follows are left out of the matches. A query without topic words
+    ("who should I follow?") searches for the user's stored interest topics.
+    """
+    terms = [term for term in tokenize(query) if term not in QUERY_STOPWORDS]
+    if not terms:
+        terms = list(dict.fromkeys(term for topic in profile_topics(username)
+                                   for term in tokenize(topic["label"]) if term not in QUERY_STOPWORDS))
+    matches = search_accounts_text(terms, limit, exclude_followed_by=username)
+    posts = get_account_posts([match["did"] for match in matches])
+    matched = [dict(match, posts=posts.get(match["did"], [])) for match in matches]
+    seen = {match["did"] for match in matched}
+    return matched + [c for c in stored_candidates if c.get("did") not in seen]
+
+
+def build_chat_context(query, candidates, subreddits, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Build the BLUESKY CONNECTIONS and REDDIT SUBSCRIPTIONS prompt sections for
+    a chat query, keeping only the entries most relevant to it.
+
+    The budget goes to the platform named in the query, or is split evenly
+    when neither or both are named; whatever one platform leaves unused is
+    given to the other. Returns (bluesky_section, reddit_section).
+    """
+    lowered = query.lower()
+    wants_bluesky = "bluesky" in lowered or "bsky" in lowered
+    wants_reddit = "reddit" in lowered or "subreddit" in lowered
+    if wants_bluesky == wants_reddit:
+        bluesky_share = 0.5 if candidates and subreddits else (1.0 if candidates else 0.0)
+    else:
+        bluesky_share = 1.0 if wants_bluesky else 0.0
+
+    candidate_order = _retrieve(query, [candidate_document(c) for c in candidates])
+    candidate_entries = [_format_candidate(candidates[i]) for i in candidate_order]
+    subreddit_order = _retrieve(query, [f"{s.get('name', '')} {s.get('description', '')}" for s in subreddits])
+    subreddit_entries = [_format_subreddit(subreddits[i]) for i in subreddit_order]
+
+    bluesky_entries, used = _pack(candidate_entries, int(token_budget * bluesky_share))
+    reddit_entries, used_reddit = _pack(subreddit_entries, token_budget - used)
+    if used + used_reddit < token_budget and len(bluesky_entries) < len(candidate_entries):
+        # Reddit did not need its share, give the rest back to Bluesky
+        bluesky_entries, used = _pack(candidate_entries, token_budget - used_reddit)
+
+    bluesky_section = "BLUESKY CONNECTIONS:\n" + "".join(bluesky_entries) if bluesky_entries else ""
+    reddit_section = "REDDIT SUBSCRIPTIONS:\n" + "".join(reddit_entries) if reddit_entries else ""
+    return bluesky_section, reddit_section
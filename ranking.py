@@ -0,0 +1,174 @@
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from array_utils import top_indices
+
+DEFAULT_TOP_K = 20  # Candidates forwarded to Gemini for explanation
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_+#'-]*[a-z0-9+#]|[a-z0-9]")
+STOPWORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can could
+did do does doing don't for from get got had has have having he her here hers him his how i i'm if
+in into is it it's its just like me more most my no not now of off on once one only or other our out
+over own really same she should so some such than that that's the their them then there these they
+this those through to too under until up us very was we were what when where which while who why
+will with would you your yours https http www com bsky social
+""".split())
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens with stopwords, URLs fragments and single characters removed
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+class TfidfIndex:
+    """
+    Sparse TF-IDF matrix (one L2-normalized row per document) built with NumPy/SciPy.
+
+    Scoring a query is a single sparse matrix-vector product, so it stays in
+    the millisecond range for tens of thousands of documents.
+    """
+    def __init__(self, documents):
+        self.vocabulary, rows, cols, counts = _term_counts(documents)
+        n_docs = len(documents)
+        n_terms = len(self.vocabulary)
+
+        # Smoothed idf, as in scikit-learn
+        df = np.bincount(cols, minlength=n_terms)
+        self.idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+
+        # Sublinear term frequency dampens accounts that repeat the same words
+        data = (1 + np.log(counts)) * self.idf[cols]
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(n_docs, n_terms), dtype=np.float32)
+        self.matrix = _normalize_rows(matrix)
+
+    def transform(self, text):
+        """
+        Dense, L2-normalized query vector in this index's vocabulary
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token, count in Counter(tokenize(text)).items():
+            col = self.vocabulary.get(token)
+            if col is not None:
+                vector[col] = (1 + math.log(count)) * self.idf[col]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def transform_topics(self, topics):
+        """
+        L2-normalized query vector of weighted topics ({"label", "weight"} dicts):
+        each label's vector scaled by its weight
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for topic in topics:
+            vector += topic["weight"] * self.transform(topic["label"])
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def score(self, text, topics=None):
+        """
+        Cosine similarity of every document against text, or against weighted topics when given
+        """
+        if not self.vocabulary:
+            return np.zeros(self.matrix.shape[0], dtype=np.float32)
+        return self.matrix @ (self.transform_topics(topics) if topics else self.transform(text))
+
+
+class Bm25Index:
+    """
+    Okapi BM25 over short documents, for keyword retrieval against a user query.
+
+    Per-term document weights are precomputed into a sparse matrix, so a query
+    is scored with one sparse product against its term indicator vector.
+    """
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.vocabulary, rows, cols, counts = _term_counts(documents)
+        n_docs = len(documents)
+        n_terms = len(self.vocabulary)
+
+        lengths = np.bincount(rows, weights=counts, minlength=n_docs).astype(np.float32)
+        average_length = lengths.mean() if n_docs and lengths.mean() > 0 else 1.0
+        df = np.bincount(cols, minlength=n_terms)
+        self.idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        norm = k1 * (1 - b + b * lengths[rows] / average_length)
+        data = self.idf[cols] * counts * (k1 + 1) / (counts + norm)
+        self.matrix = sparse.csr_matrix((data, (rows, cols)), shape=(n_docs, n_terms), dtype=np.float32)
+
+    def score(self, query):
+        """
+        BM25 score of every document for query (0 where no term matches)
+        """
+        indicator = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for token in set(tokenize(query)):
+            col = self.vocabulary.get(token)
+            if col is not None:
+                indicator[col] = 1
+        return self.matrix @ indicator
+
+
+def hashed_vector(text, dim):
+    """
+    Fixed-size, L2-normalized sublinear term-frequency vector of text using
+    the hashing trick. There is no vocabulary, so vectors built at different
+    times stay comparable.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, count in Counter(tokenize(text)).items():
+        hashed = zlib.crc32(token.encode("utf-8"))
+        # The top bit picks a sign so colliding tokens tend to cancel rather than add up
+        vector[hashed % dim] += (1 + math.log(count)) * (1 if hashed & 0x80000000 else -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _term_counts(documents):
+    # Vocabulary plus COO-style (row, col, count) arrays for a list of documents
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, document in enumerate(documents):
+        for token, count in Counter(tokenize(document)).items():
+            col = vocabulary.setdefault(token, len(vocabulary))
+            rows.append(row)
+            cols.append(col)
+            counts.append(count)
+    return (vocabulary, np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32),
+            np.asarray(counts, dtype=np.float32))
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def candidate_document(candidate):
+    """
+    Text that represents a stored potential connection for ranking
+    """
+    return " ".join([candidate.get("handle") or "", candidate.get("name") or ""] + list(candidate.get("posts", [])))
+
+
+def rank_candidates(candidates, interest_text, top_k=DEFAULT_TOP_K, topics=None):
+    """
+    Rank potential connections by cosine similarity to interest_text, or to
+    weighted topics (a structured interest profile) when given.
+
+    Returns up to top_k (candidate, score) pairs, best first. Candidates with
+    no overlap at all are left out.
+    """
+    if not candidates or not (interest_text or topics):
+        return []
+
+    index = TfidfIndex([candidate_document(candidate) for candidate in candidates])
+    scores = index.score(interest_text, topics)
+
+    return [(candidates[i], float(scores[i])) for i in top_indices(scores, top_k) if scores[i] > 0]
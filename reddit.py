@@ -1,5 +1,7 @@
 import praw
 
+from retry import call_with_retry
+
 def get_reddit_client(username, password):
     """
     Initialize and return a Reddit client using the provided credentials
@@ -17,20 +19,60 @@ def get_reddit_client(username, password):
         print(f"Error initializing Reddit client: {e}")
         return None
 
+ACTIVITY_TEXT_CHARS = 500  # Comment bodies and self posts are truncated to this many characters
+INFO_BATCH_SIZE = 100  # Subreddits per /api/info request, the endpoint's maximum
+
+def _subreddit_dict(subreddit):
+    description = subreddit.public_description or ""
+    return {
+        "name": subreddit.display_name,
+        "url": f"https://www.reddit.com/r/{subreddit.display_name}",
+        "subscribers": subreddit.subscribers,
+        "description": description[:100] + "..." if len(description) > 100 else description
+    }
+
 def get_subscribed_subreddits(reddit_client, limit=100):
     """
-    Get the list of subreddits the user is subscribed to
+    Get the list of subreddits the user is subscribed to. Transient errors are
+    retried; an error that persists is raised rather than returning an empty list,
+    so stored subscriptions are not replaced by nothing.
+
+    Listing items already carry their subscriber count and description, so
+    this is one request per 100 subscriptions.
     """
-    try:
-        subscribed_subreddits = []
-        for subreddit in reddit_client.user.subreddits(limit=limit):
-            subscribed_subreddits.append({
-                "name": subreddit.display_name,
-                "url": f"https://www.reddit.com/r/{subreddit.display_name}",
-                "subscribers": subreddit.subscribers,
-                "description": subreddit.public_description[:100] + "..." if len(subreddit.public_description) > 100 else subreddit.public_description
-            })
-        return subscribed_subreddits
-    except Exception as e:
-        print(f"Error fetching subscribed subreddits: {e}")
-        return []
\ No newline at end of file
+    listing = call_with_retry(lambda: list(reddit_client.user.subreddits(limit=limit)), platform="reddit")
+    return [_subreddit_dict(subreddit) for subreddit in listing]
+
+def get_recent_activity(reddit_client, reddit_username, limit=50):
+    """
+    A user's newest submissions and comments, read from their overview
+    listing (both kinds in one request per 100 items), as dicts with
+    fullname, kind, subreddit, text, score and created_utc
+    """
+    listing = call_with_retry(lambda: list(reddit_client.redditor(reddit_username).new(limit=limit)),
+                              platform="reddit")
+    activity = []
+    for item in listing:
+        is_comment = hasattr(item, "body")
+        text = item.body if is_comment else f"{item.title}\n{item.selftext or ''}".strip()
+        activity.append({
+            "fullname": item.fullname,
+            "kind": "comment" if is_comment else "submission",
+            "subreddit": item.subreddit.display_name,
+            "text": text[:ACTIVITY_TEXT_CHARS],
+            "score": item.score,
+            "created_utc": item.created_utc
+        })
+    return activity
+
+def get_subreddit_info(reddit_client, names):
+    """
+    Metadata for any number of subreddits by name through /api/info, 100 per
+    request. Banned, private or unknown subreddits are left out.
+    """
+    names = list(dict.fromkeys(names))
+    subreddits = []
+    for start in range(0, len(names), INFO_BATCH_SIZE):
+        batch = names[start:start + INFO_BATCH_SIZE]
+        subreddits += call_with_retry(lambda: list(reddit_client.info(subreddits=batch)), platform="reddit")
+    return [_subreddit_dict(subreddit) for subreddit in subreddits]
@@ -0,0 +1,126 @@
+"""
+Fetch Reddit subscriptions and recent activity for every user with stored
+Reddit credentials, e.g. from a cron job:
+
+    python reddit_ingest.py [--workers 4] [--activity-limit 50]
+
+Reddit allows 100 requests per minute per OAuth client, and every account
+signs in through the one client id in reddit.py, so all requests share the
+process-wide "reddit" rate limiter (1.5 requests per second). A user costs
+two requests, which caps a run at about 45 users per minute whatever
+--workers is; a few workers are enough to keep that budget busy.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from clients import get_reddit_client
+from database import (
+    init_db, transaction, get_usernames, get_reddit_credentials, save_reddit_subscriptions, save_reddit_activity,
+    save_subreddits, get_missing_subreddits
+)
+from interest_index import update_user_vector
+from reddit import get_subscribed_subreddits, get_recent_activity, get_subreddit_info
+
+DEFAULT_WORKERS = 4  # Enough requests in flight to use the shared rate limit; more threads only queue on it
+ACTIVITY_LIMIT = 50  # Newest submissions and comments per user, one overview page
+
+
+def ingest_user(username, reddit_client, reddit_username, activity_limit=ACTIVITY_LIMIT):
+    """
+    Fetch and store one user's subscriptions and recent activity. Returns
+    (subscriptions, activity).
+    """
+    subscriptions = get_subscribed_subreddits(reddit_client)
+    activity = get_recent_activity(reddit_client, reddit_username, activity_limit) if activity_limit else []
+    with transaction():
+        save_reddit_subscriptions(username, subscriptions)
+        save_reddit_activity(username, activity)
+    return subscriptions, activity
+
+
+def fill_subreddit_metadata(reddit_client, names):
+    """
+    Fetch and store metadata for the subreddits among names that have none
+    yet, 100 per /api/info request. Returns how many were stored.
+    """
+    missing = get_missing_subreddits(names)
+    if not missing:
+        return 0
+    subreddits = get_subreddit_info(reddit_client, missing)
+    save_subreddits(subreddits)
+    return len(subreddits)
+
+
+def ingest_users(usernames, max_workers=DEFAULT_WORKERS, activity_limit=ACTIVITY_LIMIT, on_progress=None):
+    """
+    Ingest every user in usernames that has stored Reddit credentials on a
+    pool of max_workers threads, updating their interest vectors, then fetch
+    metadata for every subreddit their activity touched in bulk. on_progress(username, error) is called
+    as each user finishes. Returns {"users", "failed", "subreddits"} counts.
+    """
+    accounts = {}
+    for username in usernames:
+        credentials = get_reddit_credentials(username)
+        if credentials:
+            accounts[username] = credentials
+
+    def ingest(username):
+        credentials = accounts[username]
+        reddit_client = get_reddit_client(credentials["reddit_username"], credentials["reddit_password"])
+        if reddit_client is None:
+            raise ValueError("Failed to initialize Reddit client")
+        _, activity = ingest_user(username, reddit_client, credentials["reddit_username"], activity_limit)
+        update_user_vector(username)
+        return reddit_client, {item["subreddit"] for item in activity}
+
+    active_subreddits = set()
+    metadata_client = None
+    counts = {"users": 0, "failed": 0, "subreddits": 0}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(ingest, username): username for username in accounts}
+        for future in as_completed(futures):
+            try:
+                reddit_client, subreddits = future.result()
+            except Exception as e:
+                counts["failed"] += 1
+                if on_progress:
+                    on_progress(futures[future], e)
+                continue
+            counts["users"] += 1
+            active_subreddits |= subreddits
+            metadata_client = metadata_client or reddit_client
+            if on_progress:
+                on_progress(futures[future], None)
+
+    if metadata_client and active_subreddits:
+        counts["subreddits"] = fill_subreddit_metadata(metadata_client, active_subreddits)
+    return counts
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--activity-limit", type=int, default=ACTIVITY_LIMIT,
+                        help="Newest submissions and comments fetched per user (0 skips activity)")
+    args = parser.parse_args()
+
+    init_db()
+    started = time.monotonic()
+
+    def report(username, error):
+        if error:
+            print(f"{username} failed: {error}")
+
+    counts = ingest_users(get_usernames(), args.workers, args.activity_limit, on_progress=report)
+    elapsed = time.monotonic() - started
+    print(f"Ingested {counts['users']} users ({counts['failed']} failed) and metadata for "
+          f"{counts['subreddits']} subreddits in {elapsed:.1f}s "
+          f"({counts['users'] / elapsed * 60 if elapsed else 0:.0f} users/min)")
+
+
+if __name__ == "__main__":
+    main()
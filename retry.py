@@ -0,0 +1,225 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import prawcore
+from atproto import exceptions as atproto_exceptions
+
+# Sustained request rates per platform. Bluesky's AppView allows 3000 requests per
+# 5 minutes per IP; Reddit's OAuth API allows 100 queries per minute per client.
+PLATFORM_REQUESTS_PER_SECOND = {"bluesky": 10, "reddit": 1.5}
+MAX_RETRIES = 4
+BASE_DELAY = 0.5  # Seconds before the first retry, doubled for each further attempt
+MAX_DELAY = 30.0  # Cap on a single backoff sleep
+MAX_SERVER_WAIT = 300.0  # A server asking for a longer wait fails the call instead of blocking it
+FAILURE_THRESHOLD = 5  # Consecutive failed attempts that open a platform's circuit
+RESET_TIMEOUT = 30.0  # Seconds an open circuit rejects calls before letting one through
+
+TRANSIENT_STATUSES = {408, 425, 429}  # Plus every 5xx
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, atproto_exceptions.NetworkError,
+                    prawcore.exceptions.RequestException)
+
+_rate_limiters = {}
+_circuit_breakers = {}
+_registry_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a platform whose circuit is open
+    """
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread that talks to the same host.
+
+    pause() holds every caller back until a server-announced reset time.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, int(rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    wait = self.resume_at - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+def get_rate_limiter(platform):
+    """
+    Return the platform's rate limiter, created once at its sustained rate and
+    shared by every caller in the process so the platform's budget is never
+    split between several buckets
+    """
+    with _registry_lock:
+        limiter = _rate_limiters.get(platform)
+        if limiter is None:
+            limiter = _rate_limiters[platform] = RateLimiter(PLATFORM_REQUESTS_PER_SECOND.get(platform, 10))
+        return limiter
+
+
+class CircuitBreaker:
+    """
+    Stops calling a platform after failure_threshold consecutive failed
+    attempts. While open, calls fail immediately with CircuitOpenError; after
+    reset_timeout one trial call is let through, and its outcome closes or
+    re-opens the circuit. A trial that ends without an outcome (e.g. a 429
+    asking to wait) or never reports back within reset_timeout lets the next
+    call through as a new trial.
+    """
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.trial_started_at = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            if (now - self.opened_at < self.reset_timeout
+                    or (self.trial_running and now - self.trial_started_at < self.reset_timeout)):
+                raise CircuitOpenError(f"circuit open after {self.failures} consecutive failures")
+            self.trial_running = True
+            self.trial_started_at = now
+
+    def end_trial(self):
+        # Called when every attempt ends: a trial that recorded no outcome must not keep the circuit wedged
+        with self.lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def get_circuit_breaker(platform):
+    with _registry_lock:
+        return _circuit_breakers.setdefault(platform, CircuitBreaker())
+
+
+def _response(exc):
+    response = getattr(exc, 'response', None)
+    return response if getattr(response, 'status_code', None) is not None else None
+
+
+def is_transient(exc):
+    """
+    Whether a failed call is worth retrying: rate limits, server errors and
+    network failures. Client errors (bad request, auth, not found) are not.
+    """
+    response = _response(exc)
+    if response is not None:
+        return response.status_code in TRANSIENT_STATUSES or response.status_code >= 500
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+def server_wait(exc):
+    """
+    Seconds the server asked us to wait (Retry-After, or Bluesky's ratelimit-reset
+    epoch and Reddit's x-ratelimit-reset seconds on a 429), or None
+    """
+    response = _response(exc)
+    if response is None:
+        return None
+    headers = response.headers or {}
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    if response.status_code == 429:
+        for header, relative in (('ratelimit-reset', False), ('x-ratelimit-reset', True)):
+            value = headers.get(header)
+            if value:
+                try:
+                    return max(float(value) if relative else float(value) - time.time(), 0.0)
+                except ValueError:
+                    pass
+    return None
+
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    # Exponential backoff with full jitter, so retrying threads spread out instead of retrying in lockstep
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retry(func, *args, platform, limiter=None, max_retries=MAX_RETRIES, on_retry=None, **kwargs):
+    """
+    Call func(*args, **kwargs) through the platform's rate limiter and circuit breaker.
+
+    Transient failures are retried up to max_retries times, waiting for as
+    long as the server asks on a 429 (pausing every caller of the limiter)
+    or with jittered exponential backoff otherwise. The last error is raised
+    once retries run out; other errors are raised immediately.
+    """
+    limiter = limiter or get_rate_limiter(platform)
+    breaker = get_circuit_breaker(platform)
+    for attempt in range(max_retries + 1):
+        breaker.before_call()
+        try:
+            limiter.acquire()
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                breaker.record_success()  # The platform answered; the request itself was bad
+                raise
+            wait = server_wait(e)
+            if wait is None:
+                # Announced rate-limit waits are handled by pausing the limiter, not by the circuit
+                breaker.record_failure()
+            if attempt == max_retries or (wait is not None and wait > MAX_SERVER_WAIT):
+                raise
+            if wait is not None:
+                limiter.pause(wait)
+            else:
+                time.sleep(backoff_delay(attempt))
+            if on_retry:
+                on_retry(e)
+            continue
+        finally:
+            breaker.end_trial()
+        breaker.record_success()
+        return result
@@ -0,0 +1,244 @@
+import time
+from types import SimpleNamespace
+
+from bluesky import iter_following_cursor_pages, get_new_following
+from database import (
+    transaction, get_following_data, save_following_data, get_potential_connections,
+    save_potential_connections, get_follower_edges, save_follower_edges,
+    get_account_sync, save_account_sync, get_crawl_checkpoint, save_crawl_checkpoint,
+    get_crawl_results, save_crawl_results, delete_crawl_checkpoint
+)
+
+CHECKPOINT_MAX_AGE = 86400  # Older checkpoints are discarded and the crawl starts over
+FOLLOWING_CHECKPOINT = "following"
+NETWORK_CHECKPOINT = "network"
+NETWORK_RESULTS = ("followers", "posts")  # Partial results saved under a network checkpoint
+
+
+def _following_dict(follow):
+    return {
+        "did": follow.did,
+        "handle": follow.handle,
+        "display_name": follow.display_name,
+        "description": getattr(follow, "description", None)
+    }
+
+
+def _feed_posts(feed):
+    # A feed's post texts and URIs, as a candidate's "posts" and "post_uris"
+    posts = [post.post for post in feed if hasattr(post.post, 'record') and hasattr(post.post.record, 'text')]
+    return {"posts": [post.record.text for post in posts], "post_uris": [getattr(post, 'uri', None) for post in posts]}
+
+
+def _resumable_state(username, kind, params):
+    # The checkpoint's state if it was saved recently by a crawl with the same parameters
+    checkpoint = get_crawl_checkpoint(username, kind)
+    if (checkpoint and checkpoint["state"].get("params") == params
+            and time.time() - checkpoint["updated_at"] < CHECKPOINT_MAX_AGE):
+        return checkpoint["state"]
+    return None
+
+
+def walk_following(client, username, on_page=None):
+    """
+    Fetch and store the full following list page by page.
+
+    Each page is saved together with the cursor after it, so a walk that
+    is interrupted resumes after the last saved page instead of from the
+    first. on_page(count) is called after each page. Returns the list.
+    """
+    params = {"actor": client.me.did}
+    state = _resumable_state(username, FOLLOWING_CHECKPOINT, params)
+    following = get_following_data(username, limit=state["count"]) if state else []
+    if state is None or len(following) != state["count"]:
+        following, cursor = [], None
+    else:
+        cursor = state["cursor"]
+
+    for page, cursor in iter_following_cursor_pages(client, cursor=cursor):
+        page_data = [_following_dict(f) for f in page]
+        with transaction():
+            save_following_data(username, page_data, start=len(following))
+            save_crawl_checkpoint(username, FOLLOWING_CHECKPOINT,
+                                  {"params": params, "cursor": cursor, "count": len(following) + len(page_data)})
+        following.extend(page_data)
+        if on_page:
+            on_page(len(following))
+
+    delete_crawl_checkpoint(username, [FOLLOWING_CHECKPOINT])
+    return following
+
+
+def sync_following(client, username, incremental=True):
+    """
+    Bring the stored following list up to date.
+
+    getFollows returns newest follows first, so an incremental sync reads
+    pages only until it reaches an account it already knows. If the stored
+    list plus the new follows does not add up to the profile's follows_count,
+    something was unfollowed and the full list is walked once instead. An
+    interrupted full walk is resumed from its checkpoint.
+
+    Returns (following, added_dids, removed_dids).
+    """
+    stored = get_following_data(username) if incremental else []
+    stored_dids = {f["did"] for f in stored}
+    if get_crawl_checkpoint(username, FOLLOWING_CHECKPOINT):
+        following = walk_following(client, username)
+        current_dids = {f["did"] for f in following}
+        return following, current_dids - stored_dids, stored_dids - current_dids
+
+    # Re-read the profile: a cached client's client.me is from its original login
+    follows_count = getattr(client.get_profile(client.me.did), "follows_count", None)
+
+    following = None
+    if stored:
+        new_follows, reached_known = get_new_following(client, stored_dids)
+        if reached_known and follows_count == len(stored) + len(new_follows):
+            following = [_following_dict(f) for f in new_follows] + stored
+
+    if following is None:
+        following = walk_following(client, username)
+    else:
+        save_following_data(username, following)
+    current_dids = {f["did"] for f in following}
+    return following, current_dids - stored_dids, stored_dids - current_dids
+
+
+def refresh_network(crawler, username, followee_dids, followers_limit=10, posts_limit=3,
+                    incremental=True, on_progress=None):
+    """
+    Rebuild the user's potential connections, re-fetching only what changed.
+
+    Followee and candidate profiles are hydrated in getProfiles batches and
+    compared with the counters stored by the previous sync:
+
+    - followers are re-fetched only for followees whose followers_count moved
+    - posts are re-fetched only for candidates whose posts_count moved
+
+    With incremental=False, or on the first sync, everything is treated as stale.
+    Accounts whose lookups fail keep their previously stored data.
+
+    Fetched followers and posts are checkpointed in SQLite as they arrive. If
+    the crawl is interrupted, the next call with the same followees and limits
+    skips the accounts already fetched; the checkpoint is dropped once the
+    results are saved.
+    """
+    def progress(message):
+        if on_progress:
+            on_progress(message)
+
+    my_did = crawler.client.me.did
+    params = {"followees": list(followee_dids), "followers_limit": followers_limit, "posts_limit": posts_limit}
+    if _resumable_state(username, NETWORK_CHECKPOINT, params) is None:
+        delete_crawl_checkpoint(username, (NETWORK_CHECKPOINT,) + NETWORK_RESULTS)
+        save_crawl_checkpoint(username, NETWORK_CHECKPOINT, {"params": params})
+    resumed_followers = get_crawl_results(username, "followers")
+    # Checkpoints saved before post URIs were recorded hold bare text lists
+    resumed_posts = {did: result if isinstance(result, dict) else {"posts": result}
+                     for did, result in get_crawl_results(username, "posts").items()}
+    if resumed_followers or resumed_posts:
+        progress(f"Resuming crawl: {len(resumed_followers)} followees and {len(resumed_posts)} "
+                 "candidates already fetched...")
+
+    stored_candidates = {c["did"]: c for c in get_potential_connections(username)} if incremental else {}
+    stored_edges = get_follower_edges(followee_dids) if incremental else {}
+    sync_state = get_account_sync(followee_dids + list(stored_candidates)) if incremental else {}
+
+    # 1. Followers of followees
+    progress("Checking followed accounts for new followers...")
+    # Change detection compares live counters, so nothing is served from the hydration cache
+    followee_profiles = crawler.fetch_profiles(followee_dids, fresh=True)
+    stale_followees = [
+        did for did in followee_dids
+        if did not in stored_edges
+        or did not in sync_state
+        or did not in followee_profiles
+        or sync_state[did]["followers_count"] != followee_profiles[did].followers_count
+    ]
+    progress(f"Fetching followers of {len(stale_followees)} changed followees...")
+    fetched_followers = {did: [SimpleNamespace(**f) for f in followers] for did, followers in resumed_followers.items()}
+    fetched_followers.update(crawler.fetch_followers(
+        [did for did in stale_followees if did not in resumed_followers],
+        limit=followers_limit,
+        on_result=lambda did, followers: save_crawl_results(
+            username, "followers", {did: [_following_dict(f) for f in followers]})
+    ))
+
+    candidate_profiles = {}
+    edges = {}
+    for did in followee_dids:
+        if did in fetched_followers:
+            followers = fetched_followers[did]
+            edges[did] = [f.did for f in followers]
+            for follower in followers:
+                candidate_profiles.setdefault(follower.did, follower)
+        else:
+            edges[did] = stored_edges.get(did, [])
+
+    # Keep discovery order stable and skip the logged-in user
+    candidate_order = []
+    seen = set()
+    for did in followee_dids:
+        for follower_did in edges[did]:
+            if follower_did != my_did and follower_did not in seen:
+                seen.add(follower_did)
+                candidate_order.append(follower_did)
+
+    # 2. Posts of candidates
+    progress(f"Checking {len(candidate_order)} candidates for new posts...")
+    hydrated = crawler.fetch_profiles(candidate_order, fresh=True)
+    stale_candidates = [
+        did for did in candidate_order
+        if did not in stored_candidates
+        or did not in sync_state
+        or did not in hydrated
+        or sync_state[did]["posts_count"] != hydrated[did].posts_count
+    ]
+    progress(f"Fetching posts of {len(stale_candidates)} changed candidates...")
+    fetched_posts = dict(resumed_posts)
+    fetched_posts.update({did: _feed_posts(feed) for did, feed in crawler.fetch_posts(
+        [did for did in stale_candidates if did not in resumed_posts],
+        limit=posts_limit,
+        on_result=lambda did, feed: save_crawl_results(username, "posts", {did: _feed_posts(feed)}),
+        fresh=True
+    ).items()})
+
+    potential_connections = []
+    for did in candidate_order:
+        profile = hydrated.get(did) or candidate_profiles.get(did)
+        stored = stored_candidates.get(did, {})
+        posts = fetched_posts[did] if did in fetched_posts else {"posts": stored.get("posts", []),
+                                                                 "post_uris": stored.get("post_uris")}
+
+        potential_connections.append({
+            "did": did,
+            "handle": profile.handle if profile else stored.get("handle"),
+            "name": profile.display_name if profile else stored.get("name"),
+            "description": getattr(profile, "description", None),
+            "posts": posts["posts"],
+            "post_uris": posts.get("post_uris")
+        })
+
+    # 3. Persist results and the counters the next sync compares against. Accounts whose
+    # lookups failed keep their old counters, so the next sync retries just those.
+    failed_followees = set(stale_followees) - set(fetched_followers)
+    failed_candidates = set(stale_candidates) - set(fetched_posts)
+    synced_profiles = ([p for did, p in followee_profiles.items() if did not in failed_followees]
+                       + [p for did, p in hydrated.items() if did not in failed_candidates])
+    with transaction():
+        for did in fetched_followers:
+            save_follower_edges(did, edges[did])
+        save_potential_connections(username, potential_connections)
+        save_account_sync([
+            {
+                "did": profile.did,
+                "posts_count": profile.posts_count,
+                "followers_count": profile.followers_count,
+                "follows_count": profile.follows_count
+            } for profile in synced_profiles
+        ])
+        delete_crawl_checkpoint(username, (NETWORK_CHECKPOINT,) + NETWORK_RESULTS)
+
+    crawler.stats.stop()
+    return potential_connections